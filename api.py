@@ -4,8 +4,8 @@ import os
 import logging
 from config import VideoConfig
 from models import load_models
-from content import process_json_prompts, generate_content, clear_gpu_memory
-from video import create_narrative_video
+from content import process_json_prompts, clear_gpu_memory
+from pipeline import run_pipeline
 import json
 from groq import Groq
 
@@ -32,6 +32,22 @@ IDIOMAS = {
     'p': {'nome': 'português do Brasil', 'vozes': ['pf_dora', 'pm_alex', 'pm_santa']}
 }
 
+def ler_parametro_numerico(data, nome, padrao, tipo=int, minimo=1):
+    """Lê um parâmetro numérico opcional, convertendo-o e verificando o valor mínimo; ValueError se inválido"""
+    valor = data.get(nome, padrao)
+    try:
+        if isinstance(valor, bool):
+            raise ValueError
+        valor = tipo(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Parâmetro '{nome}' deve ser um número: {valor!r}")
+    if valor < minimo:
+        raise ValueError(f"Parâmetro '{nome}' deve ser maior ou igual a {minimo}: {valor}")
+    return valor
+
+# Diretório dos caches em disco, definido apenas no servidor (nunca pelo cliente)
+CACHE_DIR = os.path.join("projetos", ".cache")
+
 # Carregar modelos uma vez no início
 pipe, kokoro_pipeline = None, None
 
@@ -52,6 +68,16 @@ def generate_video():
         add_music = data.get("add_music", False)
         audio_path = data.get("audio_path") if add_music else None
         add_subtitles = data.get("add_subtitles", False)
+        subtitle_mode = data.get("subtitle_mode", "burn")
+        try:
+            render_workers = ler_parametro_numerico(data, "render_workers", 1)
+            tts_workers = ler_parametro_numerico(data, "tts_workers", 1)
+            num_inference_steps = ler_parametro_numerico(data, "num_inference_steps", 25)
+            guidance_scale = ler_parametro_numerico(data, "guidance_scale", 3.0, tipo=float, minimo=0)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        generation_mode = data.get("generation_mode", "txt2img")
+        quality = data.get("quality", "full")
         enable_video = data.get("enable_video", True)
         
         # Criar pasta para o projeto
@@ -81,17 +107,25 @@ def generate_video():
             output_dir=pasta_projeto,
             lang_code=data["lang_code"],
             add_subtitles=add_subtitles,
-            enable_video_generation=enable_video
+            enable_video_generation=enable_video,
+            subtitle_mode=subtitle_mode,
+            render_workers=render_workers,
+            cache_dir=CACHE_DIR,
+            tts_workers=tts_workers,
+            generation_mode=generation_mode,
+            quality=quality,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale
         )
         
         prompts = process_json_prompts(config.json_file_path)
-        content_data = generate_content(pipe, kokoro_pipeline, prompts, config)
-        output_path = create_narrative_video(config, content_data)
+        output_path, stages = run_pipeline(pipe, kokoro_pipeline, prompts, config)
         
         return jsonify({
             "status": "success",
             "message": "Vídeo gerado com sucesso",
-            "output_path": output_path
+            "output_path": output_path,
+            "stages": stages
         })
         
     except Exception as e:
@@ -0,0 +1,29 @@
+import os
+from dataclasses import dataclass
+import soundfile as sf
+
+def probe_duration(audio_path):
+    """Duração de um arquivo de áudio lida apenas do cabeçalho (frames / taxa de amostragem)"""
+    info = sf.info(audio_path)
+    return info.frames / info.samplerate
+
+@dataclass(slots=True)
+class SceneAsset:
+    """Descritor leve de uma cena: caminhos, duração e texto, sem nenhum arquivo aberto"""
+    image_path: str
+    audio_path: str
+    duration: float
+    prompt: str
+
+    @classmethod
+    def from_files(cls, image_path, audio_path, prompt):
+        return cls(image_path, audio_path, probe_duration(audio_path), prompt)
+
+    def validate(self, index):
+        """Verifica se os arquivos da cena existem antes da renderização"""
+        if not self.image_path or not os.path.exists(self.image_path):
+            raise FileNotFoundError(f"Arquivo de imagem não encontrado: {self.image_path}")
+        if not self.audio_path or not os.path.exists(self.audio_path):
+            raise ValueError(f"Cena {index+1} não tem áudio definido")
+        if not self.duration:
+            raise ValueError(f"Cena {index+1} não tem duração definida")
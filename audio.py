@@ -0,0 +1,134 @@
+import os
+import logging
+from math import gcd
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter, resample_poly
+from scipy.ndimage import maximum_filter1d
+from ffmpeg_tools import decode_audio
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def load_audio(path, sample_rate, channels=2):
+    """Decodifica um arquivo de áudio uma única vez para float32 (amostras, canais) na taxa pedida"""
+    try:
+        audio, source_rate = sf.read(path, dtype="float32", always_2d=True)
+    except sf.LibsndfileError:
+        # Formatos fora do libsndfile (AAC/m4a, mp3 em versões antigas) passam pelo ffmpeg, como no AudioFileClip
+        return decode_audio(path, sample_rate, channels)
+    if source_rate != sample_rate:
+        factor = gcd(source_rate, sample_rate)
+        audio = resample_poly(audio, sample_rate // factor, source_rate // factor, axis=0).astype(np.float32)
+    if audio.shape[1] == channels:
+        return audio
+    if audio.shape[1] == 1:
+        return np.repeat(audio, channels, axis=1)
+    return np.repeat(audio.mean(axis=1, keepdims=True), channels, axis=1)
+
+def k_weighting_filters(sample_rate):
+    """Coeficientes do filtro K (shelf de agudos + passa-altas) para qualquer taxa de amostragem"""
+    # Pré-filtro de shelf
+    K = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    Q = 0.7071752369554196
+    Vh = 10 ** (3.999843853973347 / 20)
+    Vb = Vh ** 0.4996667741545416
+    a0 = 1 + K / Q + K * K
+    shelf = (np.array([(Vh + Vb * K / Q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / Q + K * K) / a0]),
+             np.array([1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]))
+
+    # Passa-altas RLB
+    K = np.tan(np.pi * 38.13547087613982 / sample_rate)
+    Q = 0.5003270373253953
+    a0 = 1 + K / Q + K * K
+    high_pass = (np.array([1.0, -2.0, 1.0]),
+                 np.array([1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]))
+    return shelf, high_pass
+
+def integrated_loudness(audio, sample_rate):
+    """Loudness integrada (LUFS) segundo a ITU-R BS.1770: filtro K, blocos de 400 ms e gates absoluto/relativo"""
+    weighted = audio
+    for b, a in k_weighting_filters(sample_rate):
+        weighted = lfilter(b, a, weighted, axis=0)
+
+    # Energia média de blocos de 400 ms com 75% de sobreposição, via soma acumulada
+    block, step = int(0.4 * sample_rate), int(0.1 * sample_rate)
+    energy = np.concatenate([[0.0], np.cumsum((weighted ** 2).sum(axis=1))])
+    if len(weighted) < block:
+        powers = np.array([energy[-1] / max(len(weighted), 1)])
+    else:
+        starts = np.arange(0, len(weighted) - block + 1, step)
+        powers = (energy[starts + block] - energy[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(powers)
+    gated = powers[loudness > -70.0]
+    if not len(gated):
+        return -np.inf
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = powers[(loudness > -70.0) & (loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+def ducking_gain(sidechain, sample_rate, depth_db=-10.0, threshold_db=-40.0, release=0.4, ramp=0.15, window=0.01):
+    """Ganho (por amostra) que abaixa a música enquanto há narração, com retenção e rampas suaves"""
+    hop = max(1, int(window * sample_rate))
+    blocks = len(sidechain) // hop
+    if blocks == 0:
+        return np.ones(len(sidechain), dtype=np.float32)
+
+    # Narração ativa por janela de 10 ms, mantida durante o tempo de release para não "bombear" entre palavras
+    power = (sidechain[:blocks * hop] ** 2).mean(axis=1).reshape(blocks, hop).mean(axis=1)
+    active = power > 10 ** (threshold_db / 10)
+    active = maximum_filter1d(active.astype(np.uint8), size=2 * int(release / window) + 1) > 0
+
+    # Rampas de entrada/saída por média móvel e interpolação para a taxa de amostragem
+    gain = np.where(active, 10 ** (depth_db / 20), 1.0)
+    kernel = max(1, int(ramp / window))
+    gain = np.convolve(np.pad(gain, kernel // 2, mode="edge"), np.ones(kernel) / kernel, mode="valid")[:blocks]
+    centers = np.arange(blocks) * hop + hop / 2
+    return np.interp(np.arange(len(sidechain)), centers, gain).astype(np.float32)
+
+def mix_narrative_audio(config, narration_paths, scene_starts, duration):
+    """Mistura narrações e música de fundo em um único array float32 (amostras, 2)"""
+    sample_rate = config.audio_fps
+    total = int(np.ceil(duration * sample_rate))
+    narration = np.zeros((total, 2), dtype=np.float32)
+
+    # Cada narração é decodificada uma vez e somada na posição da sua cena
+    for path, start in zip(narration_paths, scene_starts):
+        audio = load_audio(path, sample_rate)
+        offset = int(round(start * sample_rate))
+        length = min(len(audio), total - offset)
+        if length > 0:
+            narration[offset:offset + length] += audio[:length]
+
+    mix = narration
+    if config.audio_path and os.path.exists(config.audio_path):
+        try:
+            # Música repetida ciclicamente até cobrir o vídeo e abaixada durante a narração
+            music = load_audio(config.audio_path, sample_rate)
+            music = np.resize(music, (total, 2)) * config.music_volume
+            music *= ducking_gain(narration, sample_rate, depth_db=config.music_ducking_db)[:, None]
+            mix = narration + music
+        except Exception as e:
+            # A música foi pedida explicitamente: falhar em vez de gerar o vídeo sem ela
+            logger.error(f"Erro ao adicionar música de fundo: {e}")
+            raise
+
+    # Normalizar para a loudness alvo, sem ultrapassar o pico máximo
+    loudness = integrated_loudness(mix, sample_rate)
+    if np.isfinite(loudness):
+        gain = 10 ** ((config.loudness_target - loudness) / 20)
+        peak = float(np.abs(mix).max())
+        ceiling = 10 ** (config.peak_ceiling_db / 20)
+        if peak * gain > ceiling:
+            gain = ceiling / peak
+        mix *= gain
+        logger.info(f"Áudio: loudness {loudness:.1f} LUFS -> {loudness + 20 * np.log10(gain):.1f} LUFS")
+    return mix
+
+def render_audio_track(config, narration_paths, scene_starts, duration, audio_path):
+    """Mistura o áudio do vídeo e salva em WAV PCM 16 bits para o ffmpeg"""
+    mix = mix_narrative_audio(config, narration_paths, scene_starts, duration)
+    sf.write(audio_path, mix, config.audio_fps, subtype="PCM_16")
+    return audio_path
@@ -0,0 +1,75 @@
+"""Compara o pipeline quantizado (int8 dinâmico) com o original em seeds fixas: memória, tempo e similaridade.
+
+Uso: python bench_quantization.py [passos] [resolução]
+"""
+import sys
+import time
+import numpy as np
+import cv2
+import torch
+from diffusers import DiffusionPipeline
+from models import quantize_pipeline, resident_memory
+
+PROMPTS = [
+    "a lighthouse on a rocky coast at sunset, cinematic, high quality",
+    "portrait of an old fisherman with a grey beard, cinematic, high quality",
+    "a busy medieval market street in the rain, cinematic, high quality"
+]
+SEEDS = [1, 2, 3]
+
+def ssim(image_a, image_b):
+    """SSIM médio em tons de cinza (janela gaussiana 11x11, sigma 1.5)"""
+    a = cv2.cvtColor(image_a, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    b = cv2.cvtColor(image_b, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    blur = lambda x: cv2.GaussianBlur(x, (11, 11), 1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a, var_b, cov = blur(a * a) - mu_a ** 2, blur(b * b) - mu_b ** 2, blur(a * b) - mu_a * mu_b
+    return float((((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))).mean())
+
+def psnr(image_a, image_b):
+    mse = np.mean((image_a.astype(np.float64) - image_b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def generate(pipe, steps, size):
+    """Gera uma imagem por prompt com as seeds fixas; retorna as imagens e os segundos por imagem"""
+    images = []
+    start = time.perf_counter()
+    for prompt, seed in zip(PROMPTS, SEEDS):
+        image = pipe(
+            prompt=prompt,
+            num_inference_steps=steps,
+            guidance_scale=3.0,
+            width=size,
+            height=size,
+            generator=torch.Generator("cpu").manual_seed(seed)
+        ).images[0]
+        images.append(np.asarray(image.convert("RGB")))
+    return images, (time.perf_counter() - start) / len(PROMPTS)
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    print(f"{len(PROMPTS)} imagens {size}x{size}, {steps} passos, CPU com {torch.get_num_threads()} threads\n")
+
+    pipe = DiffusionPipeline.from_pretrained(
+        "playgroundai/playground-v2.5-1024px-aesthetic",
+        torch_dtype=torch.float32,
+        use_safetensors=True
+    ).to("cpu")
+    reference, reference_time = generate(pipe, steps, size)
+    reference_memory = resident_memory()
+
+    # O mesmo pipeline é quantizado no lugar: evita manter duas cópias do modelo na memória
+    quantize_pipeline(pipe)
+    quantized, quantized_time = generate(pipe, steps, size)
+    quantized_memory = resident_memory()
+
+    print(f"{'':<12} {'float32':>10} {'int8':>10}")
+    print(f"{'RSS (GB)':<12} {reference_memory / 1024 ** 3:>10.2f} {quantized_memory / 1024 ** 3:>10.2f}")
+    print(f"{'s/imagem':<12} {reference_time:>10.1f} {quantized_time:>10.1f}\n")
+    for seed, image_a, image_b in zip(SEEDS, reference, quantized):
+        print(f"seed {seed}: SSIM {ssim(image_a, image_b):.3f}, PSNR {psnr(image_a, image_b):.1f} dB")
+
+if __name__ == "__main__":
+    main()
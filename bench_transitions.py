@@ -0,0 +1,61 @@
+"""Benchmark do custo por frame das transições comparado a um frame comum de cena.
+
+Uso: python bench_transitions.py [largura] [altura] [frames]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import cv2
+from transitions import TransitionEngine
+from video import KenBurnsRenderer
+
+def measure(label, render, frames):
+    render(0)  # aquecimento
+    start = time.perf_counter()
+    for i in range(frames):
+        render(i)
+    elapsed = (time.perf_counter() - start) / frames * 1000
+    print(f"{label:<28} {elapsed:8.2f} ms/frame")
+    return elapsed
+
+def legacy_dissolve(frame1, frame2, progress):
+    """Implementação anterior: ruído float64 novo e mistura em float64 a cada frame"""
+    height, width = frame1.shape[:2]
+    texture_noise = np.random.rand(height, width, 3) * 0.15
+    result = frame1.astype(float) * (1 - progress) + frame2.astype(float) * progress + texture_noise
+    return np.clip(result, 0, 255).astype('uint8')
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 1080
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 1920
+    frames = int(sys.argv[3]) if len(sys.argv) > 3 else 48
+    print(f"Resolução {width}x{height}, {frames} frames por medição\n")
+
+    # Duas cenas sintéticas 1024x1024 renderizadas pelo Ken Burns
+    rng = np.random.default_rng(0)
+    renderers = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(2):
+            path = os.path.join(tmp, f"scene_{i}.png")
+            cv2.imwrite(path, cv2.GaussianBlur(rng.integers(0, 256, (1024, 1024, 3), dtype=np.uint8), (0, 0), 8))
+            renderers.append(KenBurnsRenderer(path, (width, height), duration=frames / 24, fps=24))
+
+    scene_a, scene_b = renderers
+    engine = TransitionEngine(width, height)
+    out = np.empty((height, width, 3), dtype=np.uint8)
+
+    # Par de frames fixo: mede apenas o custo do kernel de transição
+    frame_a = scene_a.render_index(0).copy()
+    frame_b = scene_b.render_index(0).copy()
+
+    plain = measure("frame comum (Ken Burns)", lambda i: scene_a.render_index(i), frames)
+    legacy = measure("dissolve anterior (float64)", lambda i: legacy_dissolve(frame_a, frame_b, i / frames), frames)
+    print(f"{'':<28} {legacy / plain:8.2f}x frame comum")
+    for transition_type in ["crossfade", "dissolve", "wipe", "zoom"]:
+        cost = measure(transition_type, lambda i: engine.blend(transition_type, frame_a, frame_b, i / frames, out), frames)
+        print(f"{'':<28} {cost / plain:8.2f}x frame comum")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+_file_digests = {}
+
+def hash_key(*parts):
+    """Hash SHA-256 estável de uma combinação de valores serializáveis em JSON"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def file_digest(path):
+    """SHA-256 do conteúdo de um arquivo, memorizado por caminho, tamanho e data de modificação"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _file_digests[memo_key] = digest.hexdigest()
+    return _file_digests[memo_key]
+
+class DiskCache:
+    """Cache em disco endereçado por conteúdo, com limite de tamanho e remoção LRU"""
+
+    def __init__(self, root, max_bytes, extension=""):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}{self.extension}")
+
+    def get(self, key):
+        """Retorna o caminho da entrada (marcando-a como usada recentemente) ou None"""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return path
+
+    def fetch(self, key, destination, link=True):
+        """Copia (ou cria um hard link para) a entrada em `destination`; retorna False se ausente"""
+        path = self.get(key)
+        if path is None:
+            return False
+        if link:
+            try:
+                os.link(path, destination)
+                return True
+            except OSError:
+                pass
+        shutil.copyfile(path, destination)
+        return True
+
+    def put(self, key, source_path):
+        """Adiciona um arquivo ao cache com escrita atômica e aplica o limite de tamanho"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+        return path
+
+    def put_bytes(self, key, data):
+        """Adiciona bytes ao cache com escrita atômica e aplica o limite de tamanho"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+        return path
+
+    def evict(self):
+        """Remove as entradas usadas há mais tempo até o cache caber no limite"""
+        entries = []
+        total = 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"Cache: removida entrada antiga {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
@@ -1,19 +1,66 @@
 import os
+import math
 import torch
 
+# Proporções de treino do SDXL/Playground V2.5 (largura, altura), todas com cerca de 1 megapixel
+ASPECT_BUCKETS = [
+    (1024, 1024), (1152, 896), (896, 1152), (1216, 832), (832, 1216),
+    (1344, 768), (768, 1344), (1536, 640), (640, 1536)
+]
+
+def aspect_bucket(width, height):
+    """Resolução de geração com a proporção mais próxima da resolução final"""
+    return min(ASPECT_BUCKETS, key=lambda bucket: abs(math.log((bucket[0] / bucket[1]) / (width / height))))
+
+def scaled_resolution(resolution, long_side):
+    """Reduz a resolução mantendo a proporção, com lados múltiplos de 64 (exigência da UNet)"""
+    scale = long_side / max(resolution)
+    return tuple(max(64, round(side * scale / 64) * 64) for side in resolution)
+
 class VideoConfig:
-    def __init__(self, video_type, project_name, json_file_path, audio_path=None, voice="pm_alex", output_dir=None, lang_code='p', add_subtitles=False, enable_video_generation=False):
+    def __init__(self, video_type, project_name, json_file_path, audio_path=None, voice="pm_alex", output_dir=None, lang_code='p', add_subtitles=False, enable_video_generation=False, subtitle_mode="burn", subtitle_granularity="word", render_backend="ffmpeg", render_workers=1, cache_dir=None, tts_workers=1, generation_mode="txt2img", quality="full", num_inference_steps=25, guidance_scale=3.0):
         self.video_type = video_type.lower()
-        self.gen_resolution = (1024, 1024)  # Resolução fixa para Playground V2.5
         self.final_resolution = (1080, 1920) if video_type == "short" else (1920, 1080)
+        self.quality = quality  # "full" ou "fast" (geração em baixa resolução + upscale Lanczos em CPU)
+        self.fast_long_side = 640  # Maior lado da geração no modo "fast"
+        self.gen_resolution = aspect_bucket(*self.final_resolution)  # 768x1344 (short) ou 1344x768 (longo): sem pixels gerados para o corte
+        if quality == "fast":
+            self.gen_resolution = scaled_resolution(self.gen_resolution, self.fast_long_side)
+        self.fps = 24
+        self.video_codec = "libx264"
+        self.video_bitrate = "5000k"
+        self.audio_codec = "aac"
+        self.audio_fps = 44100
+        self.music_volume = 0.2  # Volume da música de fundo para não competir com a narração
+        self.music_ducking_db = -10.0  # Redução extra da música enquanto há narração
+        self.loudness_target = -14.0  # Loudness integrada final (LUFS)
+        self.peak_ceiling_db = -1.0  # Pico máximo após a normalização (dBFS)
+        self.render_backend = render_backend  # "ffmpeg" (pipe direto) ou "moviepy" (fallback)
+        self.render_workers = render_workers  # > 1: cenas renderizadas em paralelo como segmentos
+        self.cache_dir = cache_dir  # Diretório dos caches em disco (None desativa)
+        self.render_cache_max_bytes = 10 * 1024 ** 3  # Limite do cache de segmentos renderizados
+        self.embedding_cache_max_bytes = 1024 ** 3  # Limite do cache de embeddings de prompts
+        self.image_cache_max_bytes = 5 * 1024 ** 3  # Limite do repositório de imagens compartilhado
+        self.narration_cache_max_bytes = 2 * 1024 ** 3  # Limite do cache de narrações
+        self.num_inference_steps = num_inference_steps  # Passos de difusão (o custo por imagem cresce linearmente)
+        self.guidance_scale = guidance_scale
+        self.generation_mode = generation_mode  # "txt2img" (todas as cenas do ruído) ou "anchor" (img2img a partir da cena âncora)
+        self.anchor_scene = 0  # Índice da cena âncora, gerada por completo no modo "anchor"
+        self.anchor_strength = 0.6  # Fração dos passos executada nas demais cenas (menor = mais rápido e mais parecido com a âncora)
         self.duration_min = 15 if video_type == "short" else 60
         self.duration_max = 60 if video_type == "short" else 600
         self.output_filename = f"{'short' if video_type == 'short' else 'video'}_{project_name.replace(' ', '_')}.mp4"
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.audio_path = audio_path if audio_path and os.path.exists(audio_path) else None
         self.voice = voice
+        self.tts_speed = 1.0
+        self.tts_workers = tts_workers  # > 1: narrações sintetizadas em paralelo por processos de CPU
+        self.diffusion_batch_size = 4  # Máximo de cenas por chamada da difusão (reduzido conforme a memória livre)
+        self.pipeline_queue_size = 2  # Itens aguardando na entrada de cada estágio do pipeline
         self.output_dir = output_dir or "narrative_output"
         self.json_file_path = json_file_path
         self.lang_code = lang_code
         self.add_subtitles = add_subtitles
+        self.subtitle_mode = subtitle_mode  # "burn" (desenhadas nos frames) ou "soft" (SRT/WebVTT + faixa mov_text)
+        self.subtitle_granularity = subtitle_granularity  # "word" ou "phrase" (apenas no modo soft)
         self.enable_video_generation = enable_video_generation  # Nova opção para habilitar geração de vídeo
\ No newline at end of file
@@ -2,11 +2,13 @@ import os
 import torch
 import json
 from PIL import Image
-from moviepy.editor import AudioFileClip
-import soundfile as sf
 from tqdm import tqdm
 import random
 from diffusers import DiffusionPipeline
+from assets import SceneAsset
+from diffusion import generate_images, anchor_index
+from concurrent.futures import ThreadPoolExecutor
+from tts import narrate, NarrationPool, get_narration_cache
 
 def clear_gpu_memory():
     if torch.cuda.is_available():
@@ -17,15 +19,19 @@ def process_json_prompts(json_file_path):
         raise FileNotFoundError(f"Arquivo JSON não encontrado em: {json_file_path}")
     with open(json_file_path, "r", encoding="utf-8") as f:
         data = json.load(f)
-        prompts = data.get("scenes", data if isinstance(data, list) else [])
+        prompts = data.get("scenes", []) if isinstance(data, dict) else data
         if not prompts:
             raise ValueError("Nenhuma cena encontrada no JSON.")
+    # Seed fixada no storyboard ("seed" global ou por cena) torna as imagens reprodutíveis e reaproveitáveis
+    base_seed = data.get("seed") if isinstance(data, dict) else None
     for i, prompt in enumerate(prompts):
         if "prompt_image" not in prompt or "prompt_audio" not in prompt:
             raise ValueError(f"Prompt #{i+1} precisa de 'prompt_image' e 'prompt_audio'")
         prompt["filename"] = prompt.get("filename", f"scene_{i+1:03d}.png")
         prompt["audio_filename"] = prompt.get("audio_filename", f"audio_scene_{i+1:03d}.wav")
         prompt["style"] = prompt.get("style", "cinematic, high quality")
+        if "seed" not in prompt and base_seed is not None:
+            prompt["seed"] = base_seed + i
     return prompts
 
 def generate_content(pipe, kokoro_pipeline, prompts, config):
@@ -33,41 +39,54 @@ def generate_content(pipe, kokoro_pipeline, prompts, config):
     content_data = []
     global_seed = random.randint(1, 2147483647)
     
-    gen_width, gen_height = 1024, 1024
-    print(f"[INFO] Usando resolução {gen_width}x{gen_height} para Playground V2.5. Ajuste final será feito no vídeo.")
+    gen_width, gen_height = config.gen_resolution
+    print(f"[INFO] Usando resolução {gen_width}x{gen_height} para Playground V2.5 (proporção do vídeo final).")
 
-    for idx, item in enumerate(tqdm(prompts, desc="Gerando conteúdo")):
-        full_prompt = f"{item['prompt_image']}, {item['style']}"
-        image_path = os.path.join(config.output_dir, item["filename"])
-        
-        if not os.path.exists(image_path):
-            generator = torch.Generator(config.device).manual_seed(global_seed + idx)
-            image = pipe(
-                prompt=full_prompt,
-                negative_prompt="blurry, low quality, bad anatomy",
-                width=gen_width,
-                height=gen_height,
-                num_inference_steps=25,
-                guidance_scale=3.0,
-                generator=generator
-            ).images[0]
-            image.save(image_path)
+    # Narrações sintetizadas em paralelo por processos de CPU enquanto as imagens são geradas
+    narrations = {}
+    narration_cache = get_narration_cache(config)
+    pool = NarrationPool(config.lang_code, config.tts_workers) if config.tts_workers > 1 else None
+    executor = ThreadPoolExecutor(max_workers=config.tts_workers) if pool is not None else None
+    if executor is not None:
+        for idx, item in enumerate(prompts):
+            audio_path = os.path.join(config.output_dir, item["audio_filename"])
+            narrations[idx] = executor.submit(narrate, None, item["prompt_audio"], config, audio_path, pool, narration_cache)
 
-        audio_path = os.path.join(config.output_dir, item["audio_filename"])
-        if not os.path.exists(audio_path):
-            voice = config.voice
-            generator = kokoro_pipeline(item["prompt_audio"], voice=voice)
-            for i, (gs, ps, audio) in enumerate(generator):
-                sf.write(audio_path, audio, 24000)
-                break
-
-        audio_clip = AudioFileClip(audio_path)
-        content_data.append({
-            "image_path": image_path,
-            "audio_path": audio_path,
-            "duration": audio_clip.duration,
-            "prompt": item["prompt_audio"],
-            "audio_clip": audio_clip
-        })
+    try:
+        # Imagens pendentes geradas em lotes, com uma seed fixa por cena
+        image_jobs = [
+            (f"{item['prompt_image']}, {item['style']}", os.path.join(config.output_dir, item["filename"]), item.get("seed", global_seed + idx))
+            for idx, item in enumerate(prompts)
+        ]
+        timings = {}
+        anchor = anchor_index(config, len(image_jobs))
+        if anchor is None:
+            generate_images(pipe, image_jobs, config, gen_width, gen_height, timings=timings)
+        else:
+            # Modo âncora: a cena âncora sai do ruído; as demais partem dela por img2img
+            generate_images(pipe, [image_jobs[anchor]], config, gen_width, gen_height, timings=timings)
+            others = [job for idx, job in enumerate(image_jobs) if idx != anchor]
+            generate_images(pipe, others, config, gen_width, gen_height, init_image=image_jobs[anchor][1], timings=timings)
         clear_gpu_memory()
+        if timings.get("images"):
+            print(f"[INFO] Tempo de geração ({timings['quality']}, {timings['resolution']}): "
+                  f"difusão {timings['diffusion_seconds']:.1f}s, upscale {timings['upscale_seconds']:.1f}s, {timings['images']} imagens")
+
+        for idx, item in enumerate(tqdm(prompts, desc="Gerando conteúdo")):
+            image_path = image_jobs[idx][1]
+            audio_path = os.path.join(config.output_dir, item["audio_filename"])
+            if idx in narrations:
+                narrations[idx].result()
+            else:
+                narrate(kokoro_pipeline, item["prompt_audio"], config, audio_path, cache=narration_cache)
+
+            # Apenas o descritor da cena: a duração vem do cabeçalho do WAV, sem abrir decodificadores
+            content_data.append(SceneAsset.from_files(image_path, audio_path, item["prompt_audio"]))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if pool is not None:
+            pool.close()
+    if narration_cache is not None:
+        print(f"[INFO] Cache de narração: {narration_cache.report()}")
     return content_data
\ No newline at end of file
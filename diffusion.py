@@ -0,0 +1,247 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+import torch
+from safetensors.torch import save as save_tensors, load as load_tensors
+from PIL import Image, ImageFilter
+from cache import DiskCache, hash_key, file_digest
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+NEGATIVE_PROMPT = "blurry, low quality, bad anatomy"
+
+# Memória aproximada por imagem em um lote (ativações da UNet com CFG) a 1024x1024
+BYTES_PER_IMAGE_1024 = {torch.float16: 1.5 * 1024 ** 3, torch.bfloat16: 1.5 * 1024 ** 3, torch.float32: 3.0 * 1024 ** 3}
+
+# Limite de lote aprendido após falta de memória, por resolução, para não repetir a falha nos próximos lotes
+_batch_limits = {}
+
+def available_memory(device):
+    """Memória livre (em bytes) no dispositivo de geração"""
+    if device == "cuda" and torch.cuda.is_available():
+        free, _ = torch.cuda.mem_get_info()
+        return free
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+def adaptive_batch_size(pipe, config, width, height):
+    """Maior lote que cabe na memória disponível, limitado por config.diffusion_batch_size"""
+    dtype = getattr(pipe, "dtype", torch.float16)
+    per_image = BYTES_PER_IMAGE_1024.get(dtype, BYTES_PER_IMAGE_1024[torch.float32]) * (width * height) / (1024 * 1024)
+    fits = int(available_memory(config.device) * 0.8 // per_image)
+    return max(1, min(config.diffusion_batch_size, fits, _batch_limits.get((width, height), fits)))
+
+def model_id(pipe):
+    """Identificador do modelo para as chaves de cache, incluindo a quantização quando houver"""
+    quantization = getattr(pipe, "quantization", None)
+    return f"{pipe.name_or_path}+{quantization}" if quantization else pipe.name_or_path
+
+def is_out_of_memory(error):
+    """Erros de falta de memória da GPU ou da CPU durante a geração"""
+    if isinstance(error, torch.cuda.OutOfMemoryError):
+        return True
+    message = str(error).lower()
+    return isinstance(error, (RuntimeError, MemoryError)) and ("out of memory" in message or "can't allocate memory" in message)
+
+class PromptEmbeddingCache:
+    """Saídas dos text encoders (embeddings e pooled) por modelo + prompt, em memória e opcionalmente em .safetensors"""
+
+    def __init__(self, pipe, cache_dir=None, max_bytes=1024 ** 3, max_entries=256):
+        self.pipe = pipe
+        self.model_id = model_id(pipe)
+        self.memory = OrderedDict()
+        self.max_entries = max_entries
+        self.disk = DiskCache(cache_dir, max_bytes, extension=".safetensors") if cache_dir else None
+
+    def _remember(self, key, embeds):
+        self.memory[key] = embeds
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, prompts):
+        """Retorna (embeddings, pooled) empilhados para a lista de prompts, codificando apenas os ausentes"""
+        device = self.pipe._execution_device
+        keys = [hash_key(self.model_id, str(self.pipe.dtype), prompt) for prompt in prompts]
+        found = {}
+        for key in set(keys):
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                found[key] = self.memory[key]
+                continue
+            path = self.disk.get(key) if self.disk is not None else None
+            if path is not None:
+                with open(path, "rb") as f:
+                    tensors = load_tensors(f.read())
+                found[key] = (tensors["prompt_embeds"].to(device), tensors["pooled_prompt_embeds"].to(device))
+                self._remember(key, found[key])
+
+        # Prompts inéditos codificados juntos em uma única passada dos text encoders
+        missing = list(OrderedDict((key, prompt) for key, prompt in zip(keys, prompts) if key not in found).items())
+        if missing:
+            with torch.no_grad():
+                prompt_embeds, _, pooled_prompt_embeds, _ = self.pipe.encode_prompt(
+                    prompt=[prompt for _, prompt in missing],
+                    device=device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=False
+                )
+            for i, (key, _) in enumerate(missing):
+                found[key] = (prompt_embeds[i:i + 1], pooled_prompt_embeds[i:i + 1])
+                self._remember(key, found[key])
+                if self.disk is not None:
+                    self.disk.put_bytes(key, save_tensors({
+                        "prompt_embeds": prompt_embeds[i:i + 1].contiguous().cpu(),
+                        "pooled_prompt_embeds": pooled_prompt_embeds[i:i + 1].contiguous().cpu()
+                    }))
+
+        return (torch.cat([found[key][0] for key in keys]), torch.cat([found[key][1] for key in keys]))
+
+# Um cache por pipeline carregado, para o prompt negativo ser codificado uma única vez por processo
+_embedding_caches = {}
+
+def get_embedding_cache(pipe, config):
+    """Retorna o cache de embeddings compartilhado do pipeline"""
+    if id(pipe) not in _embedding_caches:
+        cache_dir = os.path.join(config.cache_dir, "embeddings") if config.cache_dir else None
+        _embedding_caches[id(pipe)] = PromptEmbeddingCache(pipe, cache_dir, config.embedding_cache_max_bytes)
+    return _embedding_caches[id(pipe)]
+
+# Pipeline img2img que reaproveita os componentes já carregados, um por pipeline de texto-para-imagem
+_img2img_pipelines = {}
+
+def get_img2img_pipeline(pipe):
+    """Pipeline img2img compartilhando UNet, VAE e text encoders do pipeline carregado (sem memória extra)"""
+    if id(pipe) not in _img2img_pipelines:
+        from diffusers import AutoPipelineForImage2Image
+        _img2img_pipelines[id(pipe)] = AutoPipelineForImage2Image.from_pipe(pipe)
+    return _img2img_pipelines[id(pipe)]
+
+def anchor_index(config, count):
+    """Índice da cena âncora no modo "anchor", ou None no modo texto-para-imagem"""
+    if config.generation_mode != "anchor" or count == 0:
+        return None
+    return min(max(config.anchor_scene, 0), count - 1)
+
+def get_image_store(config):
+    """Repositório de imagens compartilhado entre projetos, ou None se o cache estiver desativado"""
+    if not config.cache_dir:
+        return None
+    return DiskCache(os.path.join(config.cache_dir, "images"), config.image_cache_max_bytes, extension=".png")
+
+def upscale_size(config, width, height):
+    """Tamanho final da imagem no modo "fast" (cobrindo a resolução do vídeo), ou None sem upscale"""
+    if config.quality != "fast":
+        return None
+    scale = max(config.final_resolution[0] / width, config.final_resolution[1] / height)
+    return (round(width * scale), round(height * scale)) if scale > 1 else None
+
+def upscale_image(image, size):
+    """Amplia com Lanczos e recupera as bordas com unsharp mask, barato o bastante para CPU"""
+    image = image.resize(size, Image.LANCZOS)
+    return image.filter(ImageFilter.UnsharpMask(radius=2, percent=80, threshold=2))
+
+def image_cache_key(pipe, prompt, seed, config, width, height, init_image=None):
+    """Chave de conteúdo de uma imagem: modelo, dtype, scheduler, prompts, resolução, passos, guidance, seed, âncora e upscale"""
+    anchor = (file_digest(init_image), config.anchor_strength) if init_image else None
+    return hash_key(
+        model_id(pipe), str(pipe.dtype), type(pipe.scheduler).__name__, prompt, NEGATIVE_PROMPT, width, height, config.num_inference_steps,
+        config.guidance_scale, seed, anchor, upscale_size(config, width, height)
+    )
+
+def generate_images(pipe, jobs, config, width=1024, height=1024, init_image=None, timings=None):
+    """Gera as imagens de (prompt, caminho, seed) em lotes, uma seed por cena; retorna os caminhos gerados.
+
+    Com `init_image`, cada cena parte da imagem âncora (img2img) e roda só a fração
+    config.anchor_strength dos passos de remoção de ruído. O dicionário `timings`, se
+    informado, acumula o tempo de difusão e de upscale para comparar os níveis de qualidade.
+    """
+    if timings is not None:
+        timings.setdefault("quality", config.quality)
+        timings.setdefault("resolution", f"{width}x{height}")
+        for name in ("images", "diffusion_seconds", "upscale_seconds"):
+            timings.setdefault(name, 0)
+    pending = [job for job in jobs if not os.path.exists(job[1])]
+
+    # Imagens já geradas com os mesmos parâmetros em qualquer projeto são copiadas do repositório
+    store = get_image_store(config)
+    keys = {}
+    if store is not None:
+        for prompt, image_path, seed in list(pending):
+            keys[image_path] = image_cache_key(pipe, prompt, seed, config, width, height, init_image)
+            # Cópia (e não hard link): a imagem do projeto pode ser editada sem alterar o repositório
+            if store.fetch(keys[image_path], image_path, link=False):
+                pending.remove((prompt, image_path, seed))
+        logger.info(f"Repositório de imagens: {store.hits} reaproveitadas, {store.misses} a gerar")
+    if not pending:
+        return []
+
+    batch_size = adaptive_batch_size(pipe, config, width, height)
+    embeddings = get_embedding_cache(pipe, config)
+    generator_pipe, extra_args = pipe, {"width": width, "height": height}
+    if init_image is not None:
+        # O img2img gera no tamanho da imagem de entrada (a âncora pode ter passado pelo upscale)
+        generator_pipe = get_img2img_pipeline(pipe)
+        anchor_image = Image.open(init_image).convert("RGB")
+        if anchor_image.size != (width, height):
+            anchor_image = anchor_image.resize((width, height), Image.LANCZOS)
+        extra_args = {"image": anchor_image, "strength": config.anchor_strength}
+        logger.info(f"Modo âncora: img2img a partir de {init_image} com força {config.anchor_strength}")
+    logger.info(f"Gerando {len(pending)} imagens em lotes de até {batch_size}")
+    target_size = upscale_size(config, width, height)
+    generated = []
+    while pending:
+        batch = pending[:batch_size]
+        begin = time.perf_counter()
+        try:
+            # Embeddings pré-calculados: os text encoders só rodam para prompts nunca vistos
+            prompt_embeds, pooled_prompt_embeds = embeddings.get([prompt for prompt, _, _ in batch])
+            negative_prompt_embeds, negative_pooled_prompt_embeds = embeddings.get([NEGATIVE_PROMPT] * len(batch))
+
+            # Um gerador por cena mantém cada imagem reprodutível independentemente do lote
+            images = generator_pipe(
+                prompt_embeds=prompt_embeds,
+                pooled_prompt_embeds=pooled_prompt_embeds,
+                negative_prompt_embeds=negative_prompt_embeds,
+                negative_pooled_prompt_embeds=negative_pooled_prompt_embeds,
+                num_inference_steps=config.num_inference_steps,
+                guidance_scale=config.guidance_scale,
+                generator=[torch.Generator(config.device).manual_seed(seed) for _, _, seed in batch],
+                **extra_args
+            ).images
+        except Exception as e:
+            if batch_size == 1 or not is_out_of_memory(e):
+                raise
+            batch_size = max(1, batch_size // 2)
+            _batch_limits[(width, height)] = batch_size
+            logger.warning(f"Memória insuficiente; reduzindo o lote para {batch_size}")
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            continue
+
+        diffusion_time = time.perf_counter() - begin
+
+        upscale_time = 0.0
+        for image, (_, image_path, _) in zip(images, batch):
+            if target_size is not None:
+                begin = time.perf_counter()
+                image = upscale_image(image, target_size)
+                upscale_time += time.perf_counter() - begin
+            image.save(image_path)
+            if store is not None:
+                store.put(keys[image_path], image_path)
+            generated.append(image_path)
+        if timings is not None:
+            timings["images"] += len(batch)
+            timings["diffusion_seconds"] += diffusion_time
+            timings["upscale_seconds"] += upscale_time
+        pending = pending[len(batch):]
+    return generated
@@ -0,0 +1,119 @@
+import os
+import subprocess
+import logging
+import numpy as np
+from moviepy.config import get_setting
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def get_ffmpeg_binary():
+    """Retorna o executável do ffmpeg usado pelo MoviePy"""
+    return get_setting("FFMPEG_BINARY")
+
+def run_ffmpeg(args):
+    """Executa o ffmpeg com os argumentos fornecidos e falha se o processo retornar erro"""
+    command = [get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"] + list(args)
+    logger.info(f"Executando ffmpeg: {' '.join(command)}")
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou ({result.returncode}): {result.stderr.decode(errors='replace')}")
+
+def decode_audio(path, sample_rate, channels=2):
+    """Decodifica qualquer formato suportado pelo ffmpeg (mp3, AAC/m4a, ...) para float32 (amostras, canais)"""
+    command = [
+        get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-i", path,
+        "-vn", "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg não conseguiu decodificar {path}: {result.stderr.decode(errors='replace')}")
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, channels)
+
+def _extra_stream_args(first_index, audio_path=None, subtitle_path=None, subtitle_language="und", audio_codec="aac"):
+    """Argumentos de entrada, mapeamento e codec para as faixas opcionais de áudio e legendas"""
+    inputs, maps, codecs = [], [], []
+    index = first_index
+    if audio_path:
+        inputs += ["-i", audio_path]
+        maps += ["-map", f"{index}:a"]
+        codecs += ["-c:a", audio_codec]
+        index += 1
+    if subtitle_path:
+        inputs += ["-i", subtitle_path]
+        maps += ["-map", f"{index}:s"]
+        codecs += ["-c:s", "mov_text", "-metadata:s:s:0", f"language={subtitle_language}"]
+        index += 1
+    return inputs, maps, codecs
+
+class FFmpegFrameWriter:
+    """Envia frames RGB brutos direto para o stdin de um processo ffmpeg que codifica o MP4"""
+
+    def __init__(self, output_path, size, fps, audio_path=None, subtitle_path=None, subtitle_language="und",
+                 codec="libx264", bitrate="5000k", audio_codec="aac", preset="medium", threads=None):
+        width, height = size
+        self.output_path = output_path
+        self.frame_bytes = width * height * 3
+
+        inputs, maps, codecs = _extra_stream_args(1, audio_path, subtitle_path, subtitle_language, audio_codec)
+        command = [
+            get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "pipe:0",
+        ] + inputs + ["-map", "0:v"] + maps
+        command += ["-c:v", codec, "-preset", preset, "-b:v", bitrate, "-pix_fmt", "yuv420p"]
+        if threads:
+            command += ["-threads", str(threads)]
+        command += codecs + ["-movflags", "+faststart", output_path]
+
+        logger.info(f"Executando ffmpeg: {' '.join(command)}")
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.frames_written = 0
+    def write_frame(self, frame):
+        """Escreve um frame uint8 (altura, largura, 3) contíguo"""
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError(f"Frame com {frame.nbytes} bytes, esperado {self.frame_bytes}")
+        try:
+            self.process.stdin.write(memoryview(frame).cast("B"))
+        except BrokenPipeError:
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg encerrou durante a escrita: {self.process.stderr.read().decode(errors='replace')}")
+        self.frames_written += 1
+
+    def close(self):
+        """Fecha o stdin e aguarda o ffmpeg terminar de codificar"""
+        self.process.stdin.close()
+        error = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg falhou ({self.process.returncode}): {error.decode(errors='replace')}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.process.kill()
+            self.process.wait()
+        return False
+
+def concat_segments(segment_paths, output_path, audio_path=None, subtitle_path=None, subtitle_language="und", audio_codec="aac"):
+    """Junta segmentos de vídeo com o concat demuxer (stream copy) e adiciona áudio e legendas"""
+    list_path = f"{os.path.splitext(output_path)[0]}.segments.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    inputs, maps, codecs = _extra_stream_args(1, audio_path, subtitle_path, subtitle_language, audio_codec)
+    try:
+        run_ffmpeg(
+            ["-f", "concat", "-safe", "0", "-i", list_path] + inputs
+            + ["-map", "0:v"] + maps
+            + ["-c:v", "copy"] + codecs
+            + ["-movflags", "+faststart", output_path]
+        )
+    finally:
+        os.remove(list_path)
+    return output_path
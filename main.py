@@ -1,7 +1,7 @@
 from config import VideoConfig
 from models import load_models
-from content import process_json_prompts, generate_content, clear_gpu_memory
-from video import create_narrative_video
+from content import process_json_prompts, clear_gpu_memory
+from pipeline import run_pipeline
 import json
 from groq import Groq
 import logging
@@ -153,6 +153,11 @@ def gerar_video(pipe, kokoro_pipeline):
     # Legendas dinâmicas
     add_subtitles = input("Adicionar legendas dinâmicas? (sim/não): ").lower() in ["sim", "s"]
     logger.info(f"Opção de legendas escolhida: {add_subtitles}")
+    subtitle_mode = "burn"
+    if add_subtitles:
+        subtitle_mode = input("Modo das legendas (burn: desenhadas no vídeo / soft: faixa SRT separada, padrão 'burn'): ").lower() or "burn"
+        if subtitle_mode not in ["burn", "soft"]:
+            subtitle_mode = "burn"
     
     # Geração de vídeo
     enable_video = input("Habilitar geração de vídeos dinâmicos? (sim/não): ").lower() in ["sim", "s"]
@@ -172,11 +177,11 @@ def gerar_video(pipe, kokoro_pipeline):
 
     logger.info("Iniciando o gerador de vídeo narrativo...")
     print("Iniciando gerador de vídeo narrativo...")
-    config = VideoConfig(video_type, project_name, json_file_path, audio_path, voice, output_dir=pasta_projeto, lang_code=lang_code, add_subtitles=add_subtitles, enable_video_generation=enable_video)
+    config = VideoConfig(video_type, project_name, json_file_path, audio_path, voice, output_dir=pasta_projeto, lang_code=lang_code, add_subtitles=add_subtitles, enable_video_generation=enable_video, subtitle_mode=subtitle_mode, cache_dir=os.path.join("projetos", ".cache"))
     logger.info(f"Configuração de legendas no VideoConfig: {config.add_subtitles}")
     prompts = process_json_prompts(config.json_file_path)
-    content_data = generate_content(pipe, kokoro_pipeline, prompts, config)
-    output_path = create_narrative_video(config, content_data)
+    # Imagens, narrações e renderização em estágios sobrepostos
+    output_path, _ = run_pipeline(pipe, kokoro_pipeline, prompts, config)
     logger.info(f"Vídeo narrativo concluído e salvo em: {output_path}")
     print(f"✅ História narrativa concluída! Vídeo salvo em: {output_path}")
     return output_path
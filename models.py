@@ -1,19 +1,84 @@
+import os
+import gc
 import torch
+import diffusers
 from diffusers import DiffusionPipeline
 from kokoro import KPipeline
 
-def load_models(lang_code='p'):
+def cpu_supports_bf16():
+    """Verifica se a CPU executa bfloat16 nativamente (AVX512-BF16 ou AMX)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def apply_cpu_profile(pipe, threads=None, compile_model=False):
+    """Ajusta o pipeline para CPU: threads intra-op, layout channels_last e compilação opcional"""
+    torch.set_num_threads(threads or os.cpu_count() or 1)
+    # Convoluções da UNet e do VAE são mais rápidas em NHWC nas CPUs x86
+    pipe.unet.to(memory_format=torch.channels_last)
+    pipe.vae.to(memory_format=torch.channels_last)
+    if compile_model:
+        pipe.unet = torch.compile(pipe.unet)
+        pipe.vae.decode = torch.compile(pipe.vae.decode)
+    return pipe
+
+def resident_memory():
+    """Memória residente (RSS) do processo em bytes, ou 0 se /proc não estiver disponível"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def quantize_pipeline(pipe):
+    """Quantização dinâmica int8 das camadas lineares dos text encoders e da UNet (somente CPU, pesos em float32)"""
+    before = resident_memory()
+    for name in ("text_encoder", "text_encoder_2", "unet"):
+        module = getattr(pipe, name, None)
+        if module is not None:
+            torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    gc.collect()
+    after = resident_memory()
+    # Marca usada nas chaves dos caches: embeddings e imagens do modelo quantizado não se misturam com os originais
+    pipe.quantization = "int8-dynamic"
+    print(f"Quantização int8: memória residente {before / 1024 ** 3:.2f} GB -> {after / 1024 ** 3:.2f} GB")
+    return before, after
+
+def load_models(lang_code='p', scheduler=None, cpu_dtype=None, cpu_threads=None, compile_model=False, quantize=False):
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Usando dispositivo: {device}")
-    print("Carregando Playground V2.5...")
+    # float16 não é suportado (ou é muito lento) em CPU: bfloat16 quando há suporte nativo, senão float32
+    if device == "cuda":
+        dtype = torch.float16
+    elif quantize:
+        dtype = torch.float32  # A quantização dinâmica parte de pesos float32
+    else:
+        dtype = cpu_dtype or (torch.bfloat16 if cpu_supports_bf16() else torch.float32)
+    print(f"Carregando Playground V2.5 em {dtype}...")
     pipe = DiffusionPipeline.from_pretrained(
         "playgroundai/playground-v2.5-1024px-aesthetic",
-        torch_dtype=torch.float16,
+        torch_dtype=dtype,
         use_safetensors=True
     ).to(device)
+    if scheduler:
+        # Nome da classe do diffusers, ex.: "EDMEulerScheduler" ou "EDMDPMSolverMultistepScheduler"
+        pipe.scheduler = getattr(diffusers, scheduler).from_config(pipe.scheduler.config)
     if torch.cuda.is_available():
         pipe.enable_attention_slicing()
+        if quantize:
+            print("Quantização int8 ignorada: disponível apenas em CPU")
+    else:
+        if quantize:
+            quantize_pipeline(pipe)
+        apply_cpu_profile(pipe, cpu_threads, compile_model)
+        print(f"Perfil de CPU: {torch.get_num_threads()} threads, channels_last, compilação {'ativada' if compile_model else 'desativada'}")
     print(f"Carregando modelo Kokoro com idioma '{lang_code}'...")
     kokoro_pipeline = KPipeline(lang_code=lang_code)
     print("Modelos carregados com sucesso!")
-    return pipe, kokoro_pipeline
\ No newline at end of file
+    return pipe, kokoro_pipeline
@@ -0,0 +1,248 @@
+import os
+import time
+import queue
+import random
+import shutil
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from assets import SceneAsset
+from content import clear_gpu_memory
+from diffusion import generate_images, adaptive_batch_size, anchor_index
+from tts import narrate, NarrationPool, get_narration_cache
+from video import create_narrative_video
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Marcador de fim da fila de um estágio
+_STOP = object()
+
+class Stage:
+    """Estágio do pipeline: threads que consomem uma fila limitada e publicam os resultados como eventos"""
+
+    def __init__(self, name, func, events, workers=1, queue_size=2):
+        self.name = name
+        self.func = func
+        self.events = events
+        self.workers = workers
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.busy = 0.0
+        self.processed = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.started = time.perf_counter()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def put(self, item):
+        """Envia um item ao estágio, bloqueando enquanto a fila estiver cheia (pressão de retorno)"""
+        while not self._stopped.is_set():
+            try:
+                self.inbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed(self, items):
+        """Alimenta o estágio a partir de uma thread própria"""
+        thread = threading.Thread(target=lambda: [self.put(item) for item in items], name=f"{self.name}-feed", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while not self._stopped.is_set():
+            depth = self.inbox.qsize()
+            try:
+                item = self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                self.inbox.put(_STOP)  # Repassar às outras threads do estágio
+                break
+
+            begin = time.perf_counter()
+            try:
+                result, error = self.func(item), None
+            except Exception as e:
+                result, error = None, e
+            with self._lock:
+                self.busy += time.perf_counter() - begin
+                self.processed += 1
+                self.depth_total += depth
+                self.depth_max = max(self.depth_max, depth)
+                self.finished = time.perf_counter()
+            self.events.put((self.name, item, result, error))
+
+    def close(self, wait=True):
+        """Encerra o estágio; com wait=False descarta os itens pendentes (usado em caso de erro)"""
+        if wait:
+            self.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+        else:
+            self._stopped.set()
+
+    def report(self, wall_time):
+        """Itens, tempo ocupado, utilização e profundidade média/máxima da fila do estágio"""
+        return {
+            "stage": self.name,
+            "items": self.processed,
+            "busy_seconds": round(self.busy, 2),
+            "utilization": round(self.busy / max(wall_time * self.workers, 1e-6), 3),
+            "queue_depth_mean": round(self.depth_total / max(self.processed, 1), 2),
+            "queue_depth_max": self.depth_max
+        }
+
+def run_pipeline(pipe, kokoro_pipeline, prompts, config):
+    """Gera imagens, narrações e segmentos de vídeo em estágios sobrepostos ligados por filas limitadas"""
+    os.makedirs(config.output_dir, exist_ok=True)
+    global_seed = random.randint(1, 2147483647)
+    count = len(prompts)
+    image_paths = [os.path.join(config.output_dir, item["filename"]) for item in prompts]
+    audio_paths = [os.path.join(config.output_dir, item["audio_filename"]) for item in prompts]
+    output_path = os.path.join(config.output_dir, config.output_filename)
+    segment_dir = f"{os.path.splitext(output_path)[0]}.segments"
+
+    # Todos os estágios publicam na mesma fila de eventos; as filas limitadas ficam na entrada de cada estágio
+    events = queue.Queue()
+    pool = NarrationPool(config.lang_code, config.tts_workers) if config.tts_workers > 1 else None
+    narration_cache = get_narration_cache(config)
+
+    anchor = anchor_index(config, count)
+    timings = {}
+
+    def make_images(batch):
+        jobs = [(f"{prompts[idx]['prompt_image']}, {prompts[idx]['style']}", image_paths[idx], prompts[idx].get("seed", global_seed + idx)) for idx in batch]
+        # No modo âncora, todo lote sem a âncora parte dela por img2img (o primeiro lote é sempre a âncora sozinha)
+        init_image = image_paths[anchor] if anchor is not None and anchor not in batch else None
+        generate_images(pipe, jobs, config, *config.gen_resolution, init_image=init_image, timings=timings)
+        clear_gpu_memory()
+        return batch
+
+    def make_narration(idx):
+        narrate(kokoro_pipeline, prompts[idx]["prompt_audio"], config, audio_paths[idx], pool, narration_cache)
+        return SceneAsset.from_files(image_paths[idx], audio_paths[idx], prompts[idx]["prompt_audio"])
+
+    # A renderização incremental por segmentos só existe no backend ffmpeg
+    segmented = config.render_backend == "ffmpeg"
+    render_pool = None
+    if segmented:
+        from render import render_scene_segment, assemble_segments, get_render_cache
+        os.makedirs(segment_dir, exist_ok=True)
+        cache = get_render_cache(config)
+        scenes = [None] * count
+        # Até render_workers segmentos em paralelo, cada um em um processo com sua parte das threads de codificação
+        render_workers = max(1, config.render_workers)
+        render_threads = max(1, (os.cpu_count() or 1) // render_workers)
+        render_pool = ProcessPoolExecutor(max_workers=render_workers) if render_workers > 1 else None
+
+        def make_segment(idx):
+            return render_scene_segment(
+                config, scenes, idx, os.path.join(segment_dir, f"segment_{idx:04d}.mp4"), cache,
+                threads=render_threads, executor=render_pool
+            )
+
+    stages = [
+        Stage("imagens", make_images, events, queue_size=config.pipeline_queue_size),
+        Stage("narração", make_narration, events, workers=max(1, config.tts_workers), queue_size=config.pipeline_queue_size)
+    ]
+    if segmented:
+        stages.append(Stage("renderização", make_segment, events, workers=render_workers, queue_size=config.pipeline_queue_size))
+    image_stage, tts_stage = stages[0], stages[1]
+
+    start_time = time.perf_counter()
+    for stage in stages:
+        stage.start()
+    # Imagens pendentes agrupadas em lotes; cada lote é um item do estágio de imagens
+    missing = [idx for idx in range(count) if not os.path.exists(image_paths[idx])]
+    batch_size = adaptive_batch_size(pipe, config, *config.gen_resolution) if missing else 1
+    images_done = set(range(count)) - set(missing)
+    if anchor in missing:
+        missing.remove(anchor)
+        batches = [[anchor]] + [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    else:
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    image_stage.feed(batches)
+    tts_stage.feed(range(count))
+
+    assets, segment_paths = {}, {}
+    next_segment = 0
+    success = False
+    try:
+        pending = len(batches) + count + (count if segmented else 0)
+        while pending:
+            name, idx, result, error = events.get()
+            pending -= 1
+            if error is not None:
+                raise RuntimeError(f"Falha no estágio '{name}' (item {idx}): {error}") from error
+            if name == "imagens":
+                images_done.update(result)
+            elif name == "narração":
+                assets[idx] = result
+            else:
+                segment_paths[idx] = result
+
+            # O segmento da cena N sai assim que as imagens até N e as narrações até N + 1 existem
+            while segmented and next_segment < count:
+                needed = range(next_segment + min(2, count - next_segment))
+                if next_segment not in images_done or not all(i in assets for i in needed):
+                    break
+                if next_segment > 0 and next_segment - 1 not in images_done:
+                    break
+                for i in needed:
+                    scenes[i] = assets[i]
+                stages[2].put(next_segment)
+                next_segment += 1
+
+        content_data = [assets[idx] for idx in range(count)]
+        for stage in stages:
+            stage.close()
+
+        if segmented:
+            assemble_segments(config, content_data, [segment_paths[i] for i in range(count) if segment_paths[i]], output_path)
+        else:
+            output_path = create_narrative_video(config, content_data)
+        success = True
+    finally:
+        if not success:
+            for stage in stages:
+                stage.close(wait=False)
+        if pool is not None:
+            pool.close()
+        if render_pool is not None:
+            render_pool.shutdown(wait=True, cancel_futures=True)
+        if segmented:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    # Relatório por estágio: a latência total deve se aproximar do estágio mais lento, não da soma
+    wall_time = time.perf_counter() - start_time
+    report = [stage.report(wall_time) for stage in stages]
+    # Difusão e upscale separados no estágio de imagens, para comparar os níveis de qualidade
+    report[0]["timings"] = {name: round(value, 2) if isinstance(value, float) else value for name, value in timings.items()}
+    for entry in report:
+        logger.info(
+            f"Estágio {entry['stage']}: {entry['items']} itens, {entry['busy_seconds']}s ocupado, "
+            f"utilização {entry['utilization']:.0%}, fila média {entry['queue_depth_mean']} (máx. {entry['queue_depth_max']})"
+        )
+    if timings.get("images"):
+        logger.info(
+            f"Geração ({timings['quality']}, {timings['resolution']}): difusão {timings['diffusion_seconds']:.1f}s, "
+            f"upscale {timings['upscale_seconds']:.1f}s, {timings['images']} imagens"
+        )
+    if narration_cache is not None:
+        logger.info(f"Cache de narração: {narration_cache.report()}")
+    logger.info(f"Pipeline concluído em {wall_time:.1f}s")
+    print(f"Vídeo narrativo salvo em: {output_path}")
+    return output_path, report
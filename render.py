@@ -0,0 +1,265 @@
+import os
+import time
+import shutil
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from audio import render_audio_track
+from cache import DiskCache, hash_key, file_digest
+from ffmpeg_tools import FFmpegFrameWriter, concat_segments
+from subtitles import SUBTITLE_LANGUAGES
+from timeline import Timeline, compose_frame
+from transitions import TransitionEngine
+from video import KenBurnsRenderer, create_dynamic_subtitles, write_subtitle_files
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Incrementar quando a renderização mudar, para invalidar segmentos antigos do cache
+RENDER_CACHE_VERSION = 1
+
+class SceneRenderer:
+    """Gera os frames de uma cena (Ken Burns + legendas) direto em numpy"""
+
+    def __init__(self, item, config):
+        if not item.image_path or not os.path.exists(item.image_path):
+            raise FileNotFoundError(f"Arquivo de imagem não encontrado: {item.image_path}")
+        self.duration = item.duration
+        self.ken_burns = KenBurnsRenderer(item.image_path, config.final_resolution, self.duration, fps=config.fps)
+        self.subtitles = None
+        if config.add_subtitles and config.subtitle_mode == "burn":
+            self.subtitles = create_dynamic_subtitles(item.prompt, self.duration, config.final_resolution)
+
+    def render(self, t):
+        """Renderiza o frame no instante local t (o buffer retornado é reutilizado)"""
+        frame = self.ken_burns.render_index(self.ken_burns.frame_index(t))
+        if self.subtitles is not None:
+            self.subtitles.draw(frame, t)
+        return frame
+
+class FrameCompositor:
+    """Compõe os frames de saída (cenas + transições) a partir apenas dos caminhos e durações das cenas"""
+
+    def __init__(self, scenes, config):
+        # Apenas descritores leves (caminhos, duração, texto) para poder ser enviado a outros processos
+        self.scenes = list(scenes)
+        self.config = config
+        self.timeline = Timeline([scene.duration for scene in self.scenes], fps=config.fps)
+
+    def frames(self, start_frame=0, end_frame=None):
+        """Gera os frames [start_frame, end_frame) em um buffer reutilizado"""
+        end_frame = self.timeline.frame_count if end_frame is None else end_frame
+        width, height = self.config.final_resolution
+        out = np.empty((height, width, 3), dtype=np.uint8)
+        engine = TransitionEngine(width, height)
+        renderers = {}
+
+        def scene_frame(index, local_t):
+            if index not in renderers:
+                renderers[index] = SceneRenderer(self.scenes[index], self.config)
+            return renderers[index].render(local_t)
+
+        for n in range(start_frame, end_frame):
+            sample = self.timeline.lookup(n)
+
+            # Liberar as cenas que já terminaram
+            first_active = sample.scene_b if sample.scene_a is None else sample.scene_a
+            for index in [index for index in renderers if index < first_active]:
+                del renderers[index]
+
+            yield compose_frame(sample, scene_frame, out, engine)
+
+def _render_segment(compositor, start_frame, end_frame, segment_path, threads):
+    """Codifica um segmento de vídeo (sem áudio) com os mesmos parâmetros do vídeo final"""
+    config = compositor.config
+    with FFmpegFrameWriter(
+        segment_path, config.final_resolution, config.fps,
+        codec=config.video_codec,
+        bitrate=config.video_bitrate,
+        threads=threads
+    ) as writer:
+        for frame in compositor.frames(start_frame, end_frame):
+            writer.write_frame(frame)
+    return end_frame - start_frame
+
+def get_render_cache(config):
+    """Cache em disco dos segmentos codificados, ou None se o cache estiver desativado"""
+    if not config.cache_dir:
+        return None
+    return DiskCache(os.path.join(config.cache_dir, "render"), config.render_cache_max_bytes, extension=".mp4")
+
+def segment_cache_key(compositor, start_frame, end_frame):
+    """Chave de conteúdo de um segmento: imagens, durações, textos, amostras da linha do tempo e codificação"""
+    config = compositor.config
+    burn_subtitles = config.add_subtitles and config.subtitle_mode == "burn"
+    scene_keys = {}
+
+    def scene_key(index):
+        if index is None:
+            return None
+        if index not in scene_keys:
+            scene = compositor.scenes[index]
+            scene_keys[index] = hash_key(
+                file_digest(scene.image_path),
+                scene.duration,
+                scene.prompt if burn_subtitles else None
+            )
+        return scene_keys[index]
+
+    # Cada frame depende apenas das cenas envolvidas e dos instantes locais (inclui as transições vizinhas)
+    samples = []
+    for n in range(start_frame, end_frame):
+        sample = compositor.timeline.lookup(n)
+        samples.append((
+            scene_key(sample.scene_a), None if sample.t_a is None else round(sample.t_a, 6),
+            scene_key(sample.scene_b), None if sample.t_b is None else round(sample.t_b, 6),
+            round(sample.weight, 6), sample.transition
+        ))
+
+    return hash_key(
+        RENDER_CACHE_VERSION, config.final_resolution, config.fps,
+        config.video_codec, config.video_bitrate, samples
+    )
+
+def render_segments(compositor, output_path, audio_path, subtitle_path, cache=None):
+    """Renderiza cada cena como um segmento em paralelo e junta tudo com stream copy"""
+    config = compositor.config
+    segment_dir = f"{os.path.splitext(output_path)[0]}.segments"
+    os.makedirs(segment_dir, exist_ok=True)
+
+    ranges = compositor.timeline.scene_frame_ranges()
+    segment_paths = [os.path.join(segment_dir, f"segment_{i:04d}.mp4") for i in range(len(ranges))]
+
+    try:
+        # Reaproveitar os segmentos cujas entradas não mudaram
+        pending = []
+        for (start, end), path in zip(ranges, segment_paths):
+            key = segment_cache_key(compositor, start, end) if cache is not None else None
+            if key is not None and cache.fetch(key, path):
+                continue
+            pending.append((start, end, path, key))
+        if cache is not None:
+            logger.info(f"Cache de renderização: {len(ranges) - len(pending)} de {len(ranges)} segmentos reaproveitados")
+
+        if pending:
+            workers = max(1, min(config.render_workers, len(pending)))
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            logger.info(f"Renderizando {len(pending)} segmentos com {workers} processos ({threads} threads de codificação cada)")
+
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(_render_segment, compositor, start, end, path, threads)
+                        for start, end, path, _ in pending
+                    ]
+                    for future, (_, _, path, key) in zip(futures, pending):
+                        future.result()
+                        if key is not None:
+                            cache.put(key, path)
+            else:
+                for start, end, path, key in pending:
+                    _render_segment(compositor, start, end, path, threads)
+                    if key is not None:
+                        cache.put(key, path)
+
+        concat_segments(
+            segment_paths, output_path,
+            audio_path=audio_path,
+            subtitle_path=subtitle_path,
+            subtitle_language=SUBTITLE_LANGUAGES.get(config.lang_code, "und"),
+            audio_codec=config.audio_codec
+        )
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+    return output_path
+
+def render_scene_segment(config, scenes, index, segment_path, cache=None, threads=None, executor=None):
+    """Renderiza o segmento que começa na cena `index`; precisa apenas das cenas até index + 1.
+
+    Com `executor` (um ProcessPoolExecutor), a codificação roda em um processo do pool.
+    """
+    # A linha do tempo parcial dá os mesmos frames da completa para este segmento
+    compositor = FrameCompositor(scenes[:index + 2], config)
+    start, end = compositor.timeline.scene_frame_range(index)
+    if end <= start:
+        return None
+    key = segment_cache_key(compositor, start, end) if cache is not None else None
+    if key is not None and cache.fetch(key, segment_path):
+        return segment_path
+    if executor is not None:
+        executor.submit(_render_segment, compositor, start, end, segment_path, threads).result()
+    else:
+        _render_segment(compositor, start, end, segment_path, threads)
+    if key is not None:
+        cache.put(key, segment_path)
+    return segment_path
+
+def assemble_segments(config, content_data, segment_paths, output_path):
+    """Junta segmentos já renderizados com a faixa de áudio mixada e as legendas soft"""
+    timeline = Timeline([item.duration for item in content_data], fps=config.fps)
+    base = os.path.splitext(output_path)[0]
+    audio_path = render_audio_track(
+        config, [item.audio_path for item in content_data], timeline.starts, timeline.duration, f"{base}.mix.wav"
+    )
+    subtitle_path = None
+    if config.add_subtitles and config.subtitle_mode == "soft":
+        subtitle_path = write_subtitle_files(config, content_data, timeline.starts, output_path)
+    try:
+        concat_segments(
+            segment_paths, output_path,
+            audio_path=audio_path,
+            subtitle_path=subtitle_path,
+            subtitle_language=SUBTITLE_LANGUAGES.get(config.lang_code, "und"),
+            audio_codec=config.audio_codec
+        )
+    finally:
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+    return output_path
+
+def render_narrative_video(config, content_data):
+    """Renderiza o vídeo final gerando cada frame em numpy e enviando-o direto ao ffmpeg"""
+    for i, item in enumerate(content_data):
+        item.validate(i)
+    if not content_data:
+        raise ValueError("Nenhum clipe válido foi criado")
+
+    compositor = FrameCompositor(content_data, config)
+    timeline = compositor.timeline
+    output_path = os.path.join(config.output_dir, config.output_filename)
+    base = os.path.splitext(output_path)[0]
+    print(f"Renderizando vídeo... Duração total: {timeline.duration:.2f}s")
+
+    audio_path = render_audio_track(
+        config, [item.audio_path for item in content_data], timeline.starts, timeline.duration, f"{base}.mix.wav"
+    )
+    subtitle_path = None
+    if config.add_subtitles and config.subtitle_mode == "soft":
+        subtitle_path = write_subtitle_files(config, content_data, timeline.starts, output_path)
+
+    cache = get_render_cache(config)
+    start_time = time.time()
+    try:
+        # Com cache, o vídeo é sempre montado por segmentos para que cenas inalteradas sejam reaproveitadas
+        if cache is not None or (config.render_workers > 1 and len(content_data) > 1):
+            render_segments(compositor, output_path, audio_path, subtitle_path, cache=cache)
+        else:
+            with FFmpegFrameWriter(
+                output_path, config.final_resolution, config.fps,
+                audio_path=audio_path,
+                subtitle_path=subtitle_path,
+                subtitle_language=SUBTITLE_LANGUAGES.get(config.lang_code, "und"),
+                codec=config.video_codec,
+                bitrate=config.video_bitrate,
+                audio_codec=config.audio_codec
+            ) as writer:
+                for frame in compositor.frames():
+                    writer.write_frame(frame)
+    finally:
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+
+    elapsed = time.time() - start_time
+    logger.info(f"Renderização concluída: {timeline.frame_count} frames em {elapsed:.1f}s ({timeline.frame_count / max(elapsed, 1e-6):.1f} fps)")
+    print(f"Vídeo narrativo salvo em: {output_path}")
+    return output_path
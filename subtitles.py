@@ -0,0 +1,228 @@
+import os
+import logging
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from ffmpeg_tools import run_ffmpeg
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Cores elegantes alternadas entre as palavras
+SUBTITLE_COLORS = ['#FFFFFF', '#F5F5F5', '#FAFAFA', '#F0F0F0', '#EFEFEF']
+
+# Fontes negrito procuradas nos diretórios de fontes do sistema, em ordem de preferência
+FONT_CANDIDATES = [
+    "Arial Bold.ttf",
+    "arialbd.ttf",
+    "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+]
+
+# Códigos ISO 639-2 usados nos metadados da faixa de legendas
+SUBTITLE_LANGUAGES = {
+    'a': 'eng', 'b': 'eng', 'j': 'jpn', 'z': 'zho', 'e': 'spa',
+    'f': 'fra', 'h': 'hin', 'i': 'ita', 'p': 'por'
+}
+
+# Pontuação que encerra uma frase de legenda
+PHRASE_BREAKS = ('.', ',', '!', '?', ';', ':')
+
+_fonts = {}
+_atlases = {}
+
+def load_font(font_size, font_path=None):
+    """Carrega (com cache) uma fonte TrueType negrito via FreeType"""
+    key = (font_path, font_size)
+    if key in _fonts:
+        return _fonts[key]
+
+    font = None
+    for candidate in ([font_path] if font_path else []) + FONT_CANDIDATES:
+        try:
+            font = ImageFont.truetype(candidate, font_size)
+            break
+        except OSError:
+            continue
+    if font is None:
+        logger.warning("Nenhuma fonte TrueType encontrada, usando a fonte padrão do Pillow")
+        font = ImageFont.load_default(font_size)
+
+    _fonts[key] = font
+    return font
+
+class WordAtlas:
+    """Cache de palavras rasterizadas uma única vez em RGBA (cor pré-multiplicada + alfa)"""
+
+    def __init__(self, font_size, font_path=None, stroke_width=2, stroke_color="black"):
+        self.font = load_font(font_size, font_path)
+        self.stroke_width = stroke_width
+        self.stroke_color = stroke_color
+        self._words = {}
+
+    def get(self, word, color):
+        key = (word, color)
+        if key not in self._words:
+            self._words[key] = self._rasterize(word, color)
+        return self._words[key]
+
+    def _rasterize(self, word, color):
+        left, top, right, bottom = self.font.getbbox(word, stroke_width=self.stroke_width)
+        image = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text(
+            (-left, -top),
+            word,
+            font=self.font,
+            fill=color,
+            stroke_width=self.stroke_width,
+            stroke_fill=self.stroke_color
+        )
+        rgba = np.asarray(image, dtype=np.float32)
+        alpha = rgba[..., 3:] / 255.0
+        return rgba[..., :3] * alpha, alpha
+
+def get_word_atlas(font_size, font_path=None):
+    """Retorna o atlas de palavras compartilhado para a fonte e tamanho"""
+    key = (font_path, font_size)
+    if key not in _atlases:
+        _atlases[key] = WordAtlas(font_size, font_path)
+    return _atlases[key]
+
+class SubtitleRenderer:
+    """Legendas dinâmicas palavra por palavra, com fade e subida calculados analiticamente"""
+
+    def __init__(self, text, duration, final_resolution, atlas=None):
+        self.width, self.height = final_resolution
+        self.duration = duration
+        self.words = text.split()
+        self.word_duration = duration / len(self.words) if self.words else 0
+        self.fade_duration = min(0.3, self.word_duration / 3)
+
+        # Tamanho de fonte adaptativo; cada palavra única é rasterizada uma vez
+        font_size = min(40, int(self.width / 25))
+        self.atlas = atlas or get_word_atlas(font_size)
+        self.glyphs = [
+            self.atlas.get(word, SUBTITLE_COLORS[i % len(SUBTITLE_COLORS)])
+            for i, word in enumerate(self.words)
+        ]
+
+    def word_state(self, t):
+        """Retorna (índice da palavra, opacidade, y do topo) no instante t, ou None"""
+        if not self.words or t < 0 or t >= self.duration:
+            return None
+        index = min(int(t / self.word_duration), len(self.words) - 1)
+        local_t = t - index * self.word_duration
+
+        # Fade in/out suave
+        opacity = 1.0
+        if self.fade_duration > 0:
+            opacity = max(0.0, min(1.0, local_t / self.fade_duration, (self.word_duration - local_t) / self.fade_duration))
+
+        # Leve movimento para cima até a posição final
+        progress = min(1, local_t / (self.word_duration * 0.4))
+        y = self.height - 120 - 20 * (1 - progress)
+        return index, opacity, y
+
+    def draw(self, frame, t):
+        """Mistura a palavra ativa no frame (in-place), apenas na sua caixa delimitadora"""
+        state = self.word_state(t)
+        if state is None or state[1] <= 0:
+            return frame
+        index, opacity, y = state
+        color, alpha = self.glyphs[index]
+        glyph_height, glyph_width = alpha.shape[:2]
+
+        # Recortar a caixa da palavra aos limites do frame
+        x0 = (self.width - glyph_width) // 2
+        y0 = int(round(y))
+        fx0, fy0 = max(x0, 0), max(y0, 0)
+        fx1, fy1 = min(x0 + glyph_width, frame.shape[1]), min(y0 + glyph_height, frame.shape[0])
+        if fx1 <= fx0 or fy1 <= fy0:
+            return frame
+        gx0, gy0 = fx0 - x0, fy0 - y0
+        gx1, gy1 = gx0 + (fx1 - fx0), gy0 + (fy1 - fy0)
+
+        roi = frame[fy0:fy1, fx0:fx1]
+        a = alpha[gy0:gy1, gx0:gx1] * opacity
+        blended = roi * (1 - a) + color[gy0:gy1, gx0:gx1] * opacity
+        roi[:] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+        return frame
+
+    def overlay(self, get_frame, t):
+        """Filtro compatível com clip.fl do MoviePy"""
+        frame = get_frame(t)
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        return self.draw(frame, t)
+
+def build_subtitle_cues(scenes, granularity="word", max_words=6):
+    """Gera cues (início, fim, texto) a partir de (início da cena, duração, texto[, trechos]) de cada cena"""
+    cues = []
+    for scene in scenes:
+        scene_start, duration, text = scene[:3]
+
+        # Trechos (início, fim, texto) da síntese da narração; sem eles, palavras uniformes pela cena
+        chunks = scene[3] if len(scene) > 3 and scene[3] else [(0.0, duration, text)]
+
+        for chunk_start, chunk_end, chunk_text in chunks:
+            words = chunk_text.split()
+            if not words:
+                continue
+            word_duration = (chunk_end - chunk_start) / len(words)
+
+            if granularity == "word":
+                groups = [[i] for i in range(len(words))]
+            else:
+                # Frases de até max_words palavras, quebrando na pontuação
+                groups, current = [], []
+                for i, word in enumerate(words):
+                    current.append(i)
+                    if len(current) >= max_words or word.endswith(PHRASE_BREAKS):
+                        groups.append(current)
+                        current = []
+                if current:
+                    groups.append(current)
+
+            for group in groups:
+                start = scene_start + chunk_start + group[0] * word_duration
+                end = scene_start + chunk_start + (group[-1] + 1) * word_duration
+                cues.append((start, end, " ".join(words[i] for i in group)))
+    return cues
+
+def format_timestamp(seconds, separator=","):
+    """Formata segundos como HH:MM:SS,mmm (SRT) ou HH:MM:SS.mmm (WebVTT)"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+def write_srt(cues, path):
+    """Salva as cues no formato SubRip (.srt)"""
+    with open(path, "w", encoding="utf-8") as f:
+        for i, (start, end, text) in enumerate(cues, 1):
+            f.write(f"{i}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n")
+    return path
+
+def write_webvtt(cues, path):
+    """Salva as cues no formato WebVTT (.vtt)"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("WEBVTT\n\n")
+        for start, end, text in cues:
+            f.write(f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n\n")
+    return path
+
+def mux_subtitles(video_path, subtitle_path, lang_code='p'):
+    """Embute as legendas como faixa mov_text no MP4, sem recodificar áudio ou vídeo"""
+    base, ext = os.path.splitext(video_path)
+    temp_path = f"{base}.subs_tmp{ext}"
+    language = SUBTITLE_LANGUAGES.get(lang_code, 'und')
+    run_ffmpeg([
+        "-i", video_path,
+        "-i", subtitle_path,
+        "-map", "0", "-map", "1",
+        "-c", "copy", "-c:s", "mov_text",
+        "-metadata:s:s:0", f"language={language}",
+        temp_path
+    ])
+    os.replace(temp_path, video_path)
+    return video_path
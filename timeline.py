@@ -0,0 +1,105 @@
+from collections import namedtuple
+import numpy as np
+import cv2
+
+# Tipos de transição usados de forma alternada para variedade
+TRANSITION_TYPES = ["dissolve", "crossfade", "fade"]
+
+# Amostra da linha do tempo: frame = cena A * (1 - peso) + cena B * peso.
+# scene_a é None quando a cena B entra a partir do preto; scene_b é None fora de transições.
+TimelineSample = namedtuple("TimelineSample", ["scene_a", "t_a", "scene_b", "t_b", "weight", "transition"])
+
+def plan_transitions(durations):
+    """Define (tipo, duração) da transição de entrada de cada cena; a primeira cena não tem transição"""
+    plan = [None]
+    for i in range(1, len(durations)):
+        transition_type = TRANSITION_TYPES[i % len(TRANSITION_TYPES)]
+        # Duração da transição - mais curta para clipes curtos
+        transition_duration = min(1.0, min(durations[i-1], durations[i]) / 4)
+        plan.append((transition_type, transition_duration))
+    return plan
+
+def scene_start_times(durations, transitions):
+    """Calcula o início de cada cena na linha do tempo final (a dissolução sobrepõe as cenas)"""
+    starts = [0.0]
+    for i in range(1, len(durations)):
+        transition_type, transition_duration = transitions[i]
+        overlap = transition_duration if transition_type == "dissolve" else 0.0
+        starts.append(starts[-1] + max(0, durations[i-1] - overlap))
+    return starts
+
+class Timeline:
+    """Linha do tempo explícita: inícios, durações e janelas de transição das cenas em arrays ordenados"""
+
+    def __init__(self, durations, fps=24, transitions=None):
+        if not durations:
+            raise ValueError("A linha do tempo precisa de pelo menos uma cena")
+        self.fps = fps
+        self.transitions = transitions or plan_transitions(durations)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.starts = np.asarray(scene_start_times(durations, self.transitions), dtype=np.float64)
+        self.ends = self.starts + self.durations
+        self.duration = float(self.ends[-1])
+        self.frame_count = int(round(self.duration * fps))
+
+        # Janela de transição de entrada de cada cena
+        self.transition_types = [None] + [transition[0] for transition in self.transitions[1:]]
+        self.transition_durations = np.array([0.0] + [transition[1] for transition in self.transitions[1:]])
+
+        # Cena "dona" de cada frame (a primeira que ainda não terminou), para consulta O(1)
+        frame_times = np.arange(self.frame_count) / fps
+        self._frame_scene = self._scene_at(frame_times)
+
+    def __len__(self):
+        return len(self.durations)
+
+    def _scene_at(self, t):
+        return np.minimum(np.searchsorted(self.ends, t, side="right"), len(self.durations) - 1)
+
+    def _sample(self, scene, t):
+        local_t = t - self.starts[scene]
+        incoming = scene + 1
+
+        # Dissolução: a próxima cena já começou enquanto esta ainda não terminou
+        if incoming < len(self.durations) and self.transition_types[incoming] == "dissolve" and t >= self.starts[incoming]:
+            weight = min(1.0, (t - self.starts[incoming]) / self.transition_durations[incoming])
+            return TimelineSample(scene, local_t, incoming, t - self.starts[incoming], weight, "dissolve")
+
+        # Crossfade de entrada a partir do preto
+        if self.transition_types[scene] not in (None, "dissolve") and local_t < self.transition_durations[scene]:
+            return TimelineSample(None, None, scene, local_t, local_t / self.transition_durations[scene], self.transition_types[scene])
+
+        return TimelineSample(scene, local_t, None, None, 0.0, None)
+
+    def lookup(self, frame_index):
+        """Amostra do frame de saída `frame_index` em O(1)"""
+        frame_index = min(max(frame_index, 0), self.frame_count - 1)
+        return self._sample(int(self._frame_scene[frame_index]), frame_index / self.fps)
+
+    def lookup_time(self, t):
+        """Amostra do instante t (em segundos) em O(log n)"""
+        return self._sample(int(self._scene_at(t)), t)
+
+    def scene_frame_range(self, index):
+        """Intervalo [início, fim) de frames de saída que começam na cena `index` (depende só das cenas até index + 1)"""
+        start = min(int(round(self.starts[index] * self.fps)), self.frame_count)
+        if index + 1 == len(self.durations):
+            return start, self.frame_count
+        return start, min(int(round(self.starts[index + 1] * self.fps)), self.frame_count)
+
+    def scene_frame_ranges(self):
+        """Intervalos [início, fim) de frames de saída que começam em cada cena"""
+        ranges = [self.scene_frame_range(i) for i in range(len(self.durations))]
+        return [(start, end) for start, end in ranges if end > start]
+
+def compose_frame(sample, get_scene_frame, out, engine=None):
+    """Compõe o frame de uma amostra avaliando no máximo dois frames de cena"""
+    if sample.scene_b is None:
+        return get_scene_frame(sample.scene_a, sample.t_a)
+    frame_b = get_scene_frame(sample.scene_b, sample.t_b)
+    if sample.scene_a is None:
+        return cv2.convertScaleAbs(frame_b, dst=out, alpha=sample.weight)
+    frame_a = get_scene_frame(sample.scene_a, sample.t_a)
+    if engine is not None:
+        return engine.blend(sample.transition, frame_a, frame_b, sample.weight, out)
+    return cv2.addWeighted(frame_a, 1 - sample.weight, frame_b, sample.weight, 0, dst=out)
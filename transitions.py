@@ -0,0 +1,81 @@
+import numpy as np
+import cv2
+
+class TransitionEngine:
+    """Kernels de transição (crossfade, dissolução, wipe e zoom) sobre pares de frames uint8"""
+
+    def __init__(self, width, height, seed=0, texture_amplitude=4, wipe_softness=0.04):
+        self.width, self.height = width, height
+        rng = np.random.default_rng(seed)
+
+        # Textura de filme da dissolução, gerada uma única vez: média zero, separada em partes
+        # positiva e negativa para ser aplicada com soma e subtração saturadas (como o GrainBank)
+        texture = rng.integers(-(texture_amplitude // 2), texture_amplitude // 2 + 1, size=(height, width, 3))
+        self.texture_positive = np.clip(texture, 0, None).astype(np.uint8)
+        self.texture_negative = np.clip(-texture, 0, None).astype(np.uint8)
+
+        # Rampa da borda suave do wipe em ponto fixo (peso da cena B de 256 a 0)
+        self.ramp = np.round(np.linspace(256, 0, max(1, int(width * wipe_softness)))).astype(np.uint16)[None, :, None]
+
+        # Buffers reutilizados
+        self._out = np.empty((height, width, 3), dtype=np.uint8)
+        self._zoom_a = np.empty_like(self._out)
+        self._zoom_b = np.empty_like(self._out)
+
+    def blend(self, transition_type, frame_a, frame_b, progress, out=None):
+        """Mistura frame_a -> frame_b com progresso em [0, 1]; o buffer retornado é reutilizado"""
+        out = self._out if out is None else out
+        progress = min(max(progress, 0.0), 1.0)
+        if transition_type == "wipe":
+            return self.wipe(frame_a, frame_b, progress, out)
+        if transition_type == "zoom":
+            return self.zoom(frame_a, frame_b, progress, out)
+        if transition_type == "dissolve":
+            return self.dissolve(frame_a, frame_b, progress, out)
+        return self.crossfade(frame_a, frame_b, progress, out)
+
+    def crossfade(self, frame_a, frame_b, progress, out):
+        return cv2.addWeighted(frame_a, 1 - progress, frame_b, progress, 0, dst=out)
+
+    def dissolve(self, frame_a, frame_b, progress, out):
+        """Crossfade com textura de filme de média zero, nula no início e no fim da transição"""
+        cv2.addWeighted(frame_a, 1 - progress, frame_b, progress, 0, dst=out)
+        envelope = 4 * progress * (1 - progress)
+        if envelope > 0:
+            cv2.addWeighted(out, 1, self.texture_positive, envelope, 0, dst=out)
+            cv2.addWeighted(out, 1, self.texture_negative, -envelope, 0, dst=out)
+        return out
+
+    def wipe(self, frame_a, frame_b, progress, out):
+        """Varredura da esquerda para a direita com borda suave"""
+        band = self.ramp.shape[1]
+        edge = int(round(progress * (self.width + band))) - band
+        c0, c1 = max(edge, 0), min(edge + band, self.width)
+
+        # Regiões fora da borda são cópias diretas
+        if c0 > 0:
+            out[:, :c0] = frame_b[:, :c0]
+        if c1 < self.width:
+            out[:, max(c1, 0):] = frame_a[:, max(c1, 0):]
+
+        # Borda: mistura em ponto fixo com a rampa pré-calculada
+        if c1 > c0:
+            ramp = self.ramp[:, c0 - edge:c1 - edge]
+            mixed = frame_b[:, c0:c1] * ramp + frame_a[:, c0:c1] * (256 - ramp)
+            out[:, c0:c1] = mixed >> 8
+        return out
+
+    def _zoom_matrix(self, zoom):
+        return np.float32([
+            [zoom, 0, (self.width - 1) / 2 * (1 - zoom)],
+            [0, zoom, (self.height - 1) / 2 * (1 - zoom)]
+        ])
+
+    def zoom(self, frame_a, frame_b, progress, out):
+        """A cena A se aproxima enquanto a cena B se afasta até o enquadramento normal"""
+        size = (self.width, self.height)
+        cv2.warpAffine(frame_a, self._zoom_matrix(1 + 0.2 * progress), size, dst=self._zoom_a,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        cv2.warpAffine(frame_b, self._zoom_matrix(1.2 - 0.2 * progress), size, dst=self._zoom_b,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return cv2.addWeighted(self._zoom_a, 1 - progress, self._zoom_b, progress, 0, dst=out)
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+import threading
+import fcntl
+import unicodedata
+import multiprocessing
+from contextlib import contextmanager
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from cache import hash_key
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Taxa de amostragem fixa do Kokoro
+KOKORO_SAMPLE_RATE = 24000
+
+def segments_path(audio_path):
+    """Caminho do arquivo lateral com os trechos sintetizados de uma narração"""
+    return f"{os.path.splitext(audio_path)[0]}.segments.json"
+
+def synthesize_narration(kokoro_pipeline, text, voice, audio_path, speed=1):
+    """Sintetiza a narração completa, gravando cada trecho no WAV assim que é gerado"""
+    temp_path = f"{audio_path}.part"
+    segments = []
+    offset = 0
+    try:
+        with sf.SoundFile(temp_path, "w", samplerate=KOKORO_SAMPLE_RATE, channels=1, format="WAV", subtype="PCM_16") as f:
+            for graphemes, phonemes, audio in kokoro_pipeline(text, voice=voice, speed=speed):
+                if audio is None:
+                    continue
+                audio = audio.numpy() if hasattr(audio, "numpy") else np.asarray(audio)
+                f.write(audio)
+                segments.append({
+                    "start": offset,
+                    "end": offset + len(audio),
+                    "graphemes": graphemes,
+                    "phonemes": phonemes
+                })
+                offset += len(audio)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if not segments:
+        os.remove(temp_path)
+        raise RuntimeError(f"O Kokoro não gerou áudio para o texto: {text[:60]}")
+
+    # O arquivo lateral é gravado antes do WAV ser publicado, para nunca existir um WAV sem os trechos
+    sidecar_path = segments_path(audio_path)
+    with open(f"{sidecar_path}.part", "w", encoding="utf-8") as f:
+        json.dump({"sample_rate": KOKORO_SAMPLE_RATE, "frames": offset, "segments": segments}, f, ensure_ascii=False)
+    os.replace(f"{sidecar_path}.part", sidecar_path)
+    os.replace(temp_path, audio_path)
+
+    logger.info(f"Narração sintetizada: {len(segments)} trechos, {offset / KOKORO_SAMPLE_RATE:.2f}s em {audio_path}")
+    return segments
+
+def load_narration_segments(audio_path):
+    """Trechos (início, fim, texto) em segundos de uma narração, ou None se não houver arquivo lateral"""
+    sidecar_path = segments_path(audio_path)
+    if not os.path.exists(sidecar_path):
+        return None
+    with open(sidecar_path, encoding="utf-8") as f:
+        data = json.load(f)
+    rate = data["sample_rate"]
+    return [(segment["start"] / rate, segment["end"] / rate, segment["graphemes"]) for segment in data["segments"]]
+
+def _atomic_write(path, write):
+    """Grava `path` por meio de um temporário único no mesmo diretório e os.replace (seguro entre threads)"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _copy_text(source_path):
+    def write(temp_path):
+        with open(source_path, encoding="utf-8") as src, open(temp_path, "w", encoding="utf-8") as dst:
+            dst.write(src.read())
+    return write
+
+def normalize_text(text):
+    """Normaliza Unicode e espaços para que variações triviais do texto usem a mesma entrada do cache"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def kokoro_version():
+    try:
+        return metadata.version("kokoro")
+    except metadata.PackageNotFoundError:
+        return "desconhecida"
+
+class NarrationCache:
+    """Cache persistente de narrações (FLAC + trechos) com índice mapeado em memória e remoção LRU"""
+
+    INDEX_DTYPE = np.dtype([("key", "S32"), ("size", "<i8"), ("atime", "<f8"), ("duration", "<f8")])
+
+    def __init__(self, root, max_bytes, capacity=65536):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_progress = {}  # Chaves sendo sintetizadas agora -> evento sinalizado ao terminar
+        os.makedirs(root, exist_ok=True)
+
+        # O índice é compartilhado entre processos (main.py, workers da API): toda leitura-modificação-escrita
+        # acontece sob um flock exclusivo em index.lock, além do lock entre as threads deste processo
+        self._lock_file = open(os.path.join(root, "index.lock"), "a+b")
+
+        # Índice de tamanho fixo e contadores (acertos, faltas, segundos de áudio reaproveitados) em disco
+        index_path = os.path.join(root, "index.bin")
+        stats_path = os.path.join(root, "stats.bin")
+        with self._locked():
+            mode = "r+" if os.path.exists(index_path) else "w+"
+            self.index = np.memmap(index_path, dtype=self.INDEX_DTYPE, mode=mode, shape=(capacity,))
+            self.stats = np.memmap(stats_path, dtype="<f8", mode="r+" if os.path.exists(stats_path) else "w+", shape=(3,))
+            self.index.flush()
+            self.stats.flush()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def key(self, text, voice, lang_code, speed):
+        return hash_key(kokoro_version(), lang_code, voice, speed, normalize_text(text))[:32]
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key[:2], key)
+        return f"{base}.flac", f"{base}.segments.json"
+
+    def _slot(self, key):
+        slots = np.flatnonzero(self.index["key"] == key.encode())
+        return int(slots[0]) if len(slots) else None
+
+    def fetch(self, key, audio_path):
+        """Restaura a narração (WAV + trechos) em `audio_path`; retorna False em caso de falta"""
+        flac_path, sidecar_path = self._paths(key)
+        with self._locked():
+            slot = self._slot(key)
+            try:
+                if slot is None:
+                    raise FileNotFoundError(flac_path)
+                audio, sample_rate = sf.read(flac_path, dtype="int16")
+                # O arquivo lateral é publicado antes do WAV, como em synthesize_narration
+                if os.path.exists(sidecar_path):
+                    _atomic_write(segments_path(audio_path), _copy_text(sidecar_path))
+            except (FileNotFoundError, sf.LibsndfileError):
+                self.stats[1] += 1
+                return False
+            self.index["atime"][slot] = time.time()
+            self.stats[0] += 1
+            self.stats[2] += self.index["duration"][slot]
+        _atomic_write(audio_path, lambda temp_path: sf.write(temp_path, audio, sample_rate, format="WAV", subtype="PCM_16"))
+        return True
+
+    def put(self, key, audio_path):
+        """Adiciona a narração em FLAC (sem perdas, comprimido) e aplica o limite de tamanho"""
+        flac_path, sidecar_path = self._paths(key)
+        os.makedirs(os.path.dirname(flac_path), exist_ok=True)
+        audio, sample_rate = sf.read(audio_path, dtype="int16")
+        # Arquivos gravados sob o lock: outro processo não pode removê-los antes de a entrada ir para o índice
+        with self._locked():
+            _atomic_write(flac_path, lambda temp_path: sf.write(temp_path, audio, sample_rate, format="FLAC"))
+            size = os.path.getsize(flac_path)
+            if os.path.exists(segments_path(audio_path)):
+                _atomic_write(sidecar_path, _copy_text(segments_path(audio_path)))
+                size += os.path.getsize(sidecar_path)
+
+            slot = self._slot(key)
+            if slot is None:
+                free = np.flatnonzero(self.index["size"] == 0)
+                slot = int(free[0]) if len(free) else int(np.argmin(self.index["atime"]))
+                if not len(free):
+                    self._remove(slot)
+            self.index[slot] = (key.encode(), size, time.time(), len(audio) / sample_rate)
+            self._evict()
+            self.index.flush()
+            self.stats.flush()
+
+    def reserve(self, key):
+        """Reserva a síntese de `key`: retorna None se esta thread deve sintetizar, ou o evento de quem já está sintetizando"""
+        with self._lock:
+            if key in self._in_progress:
+                return self._in_progress[key]
+            self._in_progress[key] = threading.Event()
+            return None
+
+    def release(self, key):
+        """Libera a reserva de `key` e acorda as threads que aguardavam o resultado"""
+        with self._lock:
+            event = self._in_progress.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _remove(self, slot):
+        for path in self._paths(self.index["key"][slot].decode()):
+            if os.path.exists(path):
+                os.remove(path)
+        self.index[slot] = (b"", 0, 0.0, 0.0)
+
+    def _evict(self):
+        used = self.index["size"] > 0
+        total = int(self.index["size"][used].sum())
+        # Entradas usadas há mais tempo primeiro
+        for slot in np.flatnonzero(used)[np.argsort(self.index["atime"][used])]:
+            if total <= self.max_bytes:
+                break
+            total -= int(self.index["size"][slot])
+            self._remove(slot)
+
+    def report(self):
+        """Acertos, faltas e segundos de áudio que não precisaram ser sintetizados"""
+        with self._locked():
+            hits, misses, saved = (float(value) for value in self.stats)
+        return {"hits": int(hits), "misses": int(misses), "saved_seconds": round(saved, 1)}
+
+# Um cache por diretório, compartilhado entre as threads do processo
+_narration_caches = {}
+
+def get_narration_cache(config):
+    """Cache de narrações compartilhado entre projetos, ou None se o cache estiver desativado"""
+    if not config.cache_dir:
+        return None
+    root = os.path.join(config.cache_dir, "narration")
+    if root not in _narration_caches:
+        _narration_caches[root] = NarrationCache(root, config.narration_cache_max_bytes)
+    return _narration_caches[root]
+
+def narrate(kokoro_pipeline, text, config, audio_path, pool=None, cache=None):
+    """Gera a narração de uma cena a partir do cache, do pool de processos ou do pipeline local"""
+    if os.path.exists(audio_path):
+        return audio_path
+    key = cache.key(text, config.voice, config.lang_code, config.tts_speed) if cache is not None else None
+    if key is not None:
+        # Falas repetidas (aberturas, chamadas) são sintetizadas uma única vez; as demais threads aguardam o cache
+        while True:
+            in_progress = cache.reserve(key)
+            if in_progress is None:
+                break
+            in_progress.wait()
+    try:
+        if key is not None and cache.fetch(key, audio_path):
+            return audio_path
+        if pool is not None:
+            pool.submit(text, config.voice, audio_path, config.tts_speed).result()
+        else:
+            synthesize_narration(kokoro_pipeline, text, config.voice, audio_path, config.tts_speed)
+        if key is not None:
+            cache.put(key, audio_path)
+    finally:
+        if key is not None:
+            cache.release(key)
+    return audio_path
+
+# KPipeline do processo trabalhador, criado uma única vez no inicializador
+_worker_pipeline = None
+
+def _init_worker(lang_code, threads):
+    global _worker_pipeline
+    import torch
+    from kokoro import KPipeline
+    torch.set_num_threads(threads)
+    _worker_pipeline = KPipeline(lang_code=lang_code, device="cpu")
+
+def _synthesize_job(text, voice, audio_path, speed):
+    synthesize_narration(_worker_pipeline, text, voice, audio_path, speed)
+    return audio_path
+
+class NarrationPool:
+    """Pool de processos que sintetizam narrações em CPU em paralelo, cada um com seu próprio KPipeline"""
+
+    def __init__(self, lang_code, workers):
+        self.workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # "spawn" evita herdar o estado do torch/CUDA do processo principal
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(lang_code, threads)
+        )
+        logger.info(f"Pool de TTS iniciado com {workers} processos ({threads} threads cada)")
+
+    def submit(self, text, voice, audio_path, speed=1):
+        """Agenda uma narração; o resultado (caminho do WAV) fica disponível no future retornado"""
+        return self.executor.submit(_synthesize_job, text, voice, audio_path, speed)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
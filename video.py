@@ -1,95 +1,332 @@
 import os
+import copy
 import numpy as np
 from moviepy.editor import (
-    ImageClip, concatenate_videoclips, AudioFileClip, CompositeVideoClip,
-    TextClip, ColorClip, VideoFileClip, VideoClip, CompositeAudioClip, concatenate_audioclips
+    concatenate_videoclips, AudioFileClip, CompositeVideoClip,
+    ColorClip, VideoFileClip, VideoClip, CompositeAudioClip
 )
 import moviepy.video.fx.all as vfx
 import moviepy.audio.fx.all as afx
-import moviepy.config as mp_config
 import logging
 import random
+from collections import OrderedDict
 import cv2
 from scipy.interpolate import interp1d
+from audio import render_audio_track
+from timeline import Timeline, compose_frame
+from transitions import TransitionEngine
+from tts import load_narration_segments
+from subtitles import SubtitleRenderer, build_subtitle_cues, write_srt, write_webvtt, mux_subtitles
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-# Verificar e configurar o caminho do ImageMagick
-if not mp_config.IMAGEMAGICK_BINARY:
-    mp_config.IMAGEMAGICK_BINARY = "/usr/bin/convert"  # Caminho padrão no Colab após instalação
+# Cache LRU com número máximo de entradas, usado pelos efeitos pré-calculados
+class _LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key, factory):
+        """Retorna o valor em cache para `key`, criando-o com `factory()` se necessário"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        value = factory()
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+# Parâmetros dos estilos de color grading
+COLOR_GRADING_STYLES = {
+    "drama": {"contrast": 1.2, "saturation": 0.85, "brightness": 0.95, "temp": 0.95},
+    "thriller": {"contrast": 1.3, "saturation": 0.7, "brightness": 0.8, "temp": 0.8},
+    "romance": {"contrast": 1.1, "saturation": 1.1, "brightness": 1.05, "temp": 1.05},
+    "sci_fi": {"contrast": 1.15, "saturation": 0.9, "brightness": 0.9, "temp": 1.2}
+}
+
+# Cada LUT densa ocupa 64 MB, então mantemos poucas em memória
+_lut_cache = _LRUCache(max_entries=4)
+
+class ColorLUT:
+    """LUT 3D densa (256³ entradas RGB) aplicada com uma única consulta por frame"""
+
+    def __init__(self, table):
+        # Empacotar cada entrada RGB em um uint32 para que a consulta seja um gather alinhado
+        packed = np.zeros((256 ** 3, 4), dtype=np.uint8)
+        packed[:, :3] = np.asarray(table, dtype=np.uint8).reshape(256 ** 3, 3)
+        self.table = packed.view(np.uint32).ravel()
+        self._index = None
+        self._packed = None
+
+    @classmethod
+    def from_function(cls, transform, chunk=16):
+        """Compila uma transformação de cor por pixel avaliando-a em todo o cubo RGB"""
+        table = np.empty((256 ** 3, 3), dtype=np.uint8)
+        g, b = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing="ij")
+        block = np.empty((chunk, 256, 256, 3), dtype=np.uint8)
+        block[..., 1] = g
+        block[..., 2] = b
+        for r0 in range(0, 256, chunk):
+            block[..., 0] = np.arange(r0, r0 + chunk, dtype=np.uint8)[:, None, None]
+            graded = transform(block.reshape(chunk * 256, 256, 3))
+            table[r0 * 65536:(r0 + chunk) * 65536] = graded.reshape(-1, 3)
+        return cls(table)
+
+    def apply(self, image, out=None):
+        """Aplica a LUT a um frame RGB uint8 em uma única passada vetorizada"""
+        image = np.asarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        if self._index is None or self._index.shape != (height, width):
+            self._index = np.empty((height, width), dtype=np.uint32)
+            self._packed = np.empty((height, width), dtype=np.uint32)
+
+        # Índice linear r << 16 | g << 8 | b no buffer reutilizado
+        index = self._index
+        np.copyto(index, image[..., 0])
+        index <<= 8
+        index |= image[..., 1]
+        index <<= 8
+        index |= image[..., 2]
+
+        self.table.take(index, out=self._packed, mode="clip")
+        rgba = self._packed.view(np.uint8).reshape(height, width, 4)
+        if out is None:
+            return cv2.cvtColor(rgba, cv2.COLOR_RGBA2RGB)
+        return cv2.cvtColor(rgba, cv2.COLOR_RGBA2RGB, dst=out)
+
+def _grade_reference(image, params):
+    """Cadeia de referência do color grading (contraste, saturação, brilho e temperatura)"""
+    # Contraste (equivalente ao vfx.colorx)
+    image = np.minimum(255, params["contrast"] * image).astype("uint8")
+
+    # Ajuste de saturação
+    hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(float)
+    hsv[:,:,1] = np.clip(hsv[:,:,1] * params["saturation"], 0, 255)
+    image = cv2.cvtColor(hsv.astype("uint8"), cv2.COLOR_HSV2RGB)
+
+    # Ajuste de brilho
+    image = np.clip(image.astype(float) * params["brightness"], 0, 255).astype("uint8")
+
+    # Ajuste de temperatura
+    b, g, r = cv2.split(image)
+    if params["temp"] < 1:
+        b = np.clip(b.astype(float) * (2 - params["temp"]), 0, 255).astype("uint8")
+    else:
+        r = np.clip(r.astype(float) * params["temp"], 0, 255).astype("uint8")
+    return cv2.merge([b, g, r])
+
+def compile_style_lut(style="drama"):
+    """Compila (uma vez por processo) a LUT de um estilo de color grading"""
+    style = style if style in COLOR_GRADING_STYLES else "drama"
+    params = COLOR_GRADING_STYLES[style]
+    return _lut_cache.get(("style", style), lambda: ColorLUT.from_function(lambda image: _grade_reference(image, params)))
+
+def _parse_cube_file(lut_path):
+    """Lê um arquivo .cube (Adobe/Resolve) e retorna a grade 3D indexada como [b, g, r]"""
+    size = None
+    domain_min = np.zeros(3, dtype=np.float32)
+    domain_max = np.ones(3, dtype=np.float32)
+    values = []
+    with open(lut_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith("TITLE"):
+                continue
+            keyword = line.split()[0]
+            if keyword == "LUT_3D_SIZE":
+                size = int(line.split()[1])
+            elif keyword == "LUT_1D_SIZE":
+                raise ValueError(f"LUTs 1D não são suportadas: {lut_path}")
+            elif keyword == "DOMAIN_MIN":
+                domain_min = np.array(line.split()[1:4], dtype=np.float32)
+            elif keyword == "DOMAIN_MAX":
+                domain_max = np.array(line.split()[1:4], dtype=np.float32)
+            else:
+                values.append(line.split()[:3])
+
+    if size is None or size < 2:
+        raise ValueError(f"LUT_3D_SIZE ausente ou inválido em: {lut_path}")
+    if len(values) != size ** 3:
+        raise ValueError(f"LUT {lut_path} tem {len(values)} entradas, esperado {size ** 3}")
+
+    # No formato .cube o canal vermelho varia mais rápido
+    grid = np.array(values, dtype=np.float32).reshape(size, size, size, 3)
+    return grid, domain_min, domain_max
+
+def _sample_cube(grid, domain_min, domain_max, image):
+    """Interpolação trilinear da grade .cube para pixels RGB uint8"""
+    size = grid.shape[0]
+    coords = (image.astype(np.float32) / 255.0 - domain_min) / (domain_max - domain_min) * (size - 1)
+    coords = np.clip(coords, 0, size - 1)
+    base = np.minimum(coords.astype(np.int32), size - 2)
+    frac = coords - base
+
+    result = np.zeros(image.shape, dtype=np.float32)
+    for dr in (0, 1):
+        wr = frac[..., 0] if dr else 1 - frac[..., 0]
+        for dg in (0, 1):
+            wg = frac[..., 1] if dg else 1 - frac[..., 1]
+            for db in (0, 1):
+                wb = frac[..., 2] if db else 1 - frac[..., 2]
+                corner = grid[base[..., 2] + db, base[..., 1] + dg, base[..., 0] + dr]
+                result += (wr * wg * wb)[..., None] * corner
+    return np.clip(result * 255 + 0.5, 0, 255).astype(np.uint8)
+
+def load_cube_lut(lut_path):
+    """Carrega e compila uma LUT .cube personalizada, com cache por caminho e data de modificação"""
+    if not os.path.exists(lut_path):
+        raise FileNotFoundError(f"Arquivo LUT não encontrado: {lut_path}")
+    lut_path = os.path.abspath(lut_path)
+
+    def build():
+        logger.info(f"Compilando LUT personalizada: {lut_path}")
+        grid, domain_min, domain_max = _parse_cube_file(lut_path)
+        return ColorLUT.from_function(lambda image: _sample_cube(grid, domain_min, domain_max, image))
+
+    return _lut_cache.get(("cube", lut_path, os.path.getmtime(lut_path)), build)
+
+# Máscaras pré-calculadas por resolução e parâmetros (vinheta e profundidade de campo)
+_mask_cache = _LRUCache(max_entries=16)
+
+class VignetteMask:
+    """Máscara de vinheta uint8 aplicada com uma única multiplicação saturada"""
+
+    def __init__(self, width, height, intensity):
+        x = np.linspace(-1, 1, width, dtype=np.float32)
+        y = np.linspace(-1, 1, height, dtype=np.float32)
+        radius = np.sqrt(x[None, :] ** 2 + y[:, None] ** 2)
+        vignette = np.clip(1 - intensity * radius, 0, 1)
+        mask = np.round(vignette * 255).astype(np.uint8)
+        self.mask = cv2.merge([mask, mask, mask])
+
+    def apply(self, image, out=None):
+        return cv2.multiply(np.asarray(image, dtype=np.uint8), self.mask, dst=out, scale=1 / 255)
+
+class DepthOfFieldMask:
+    """Faixas de desfoque pré-calculadas em torno do ponto focal"""
+
+    def __init__(self, width, height, focus_point, blur_intensity):
+        focus_x, focus_y = int(width * focus_point[0]), int(height * focus_point[1])
+
+        # Distância normalizada do ponto focal
+        Y, X = np.ogrid[:height, :width]
+        dist_from_focus = np.sqrt((X - focus_x) ** 2 + (Y - focus_y) ** 2, dtype=np.float32)
+        max_dist = np.sqrt(width ** 2 + height ** 2) / 2
+        blur_amount = np.clip(dist_from_focus / max_dist, 0, 1) * blur_intensity
+
+        # Uma máscara uint8 por tamanho de kernel, apenas para faixas não vazias
+        self.bands = []
+        for blur in range(1, int(blur_intensity) + 1, 2):
+            mask = (blur_amount >= blur - 1) & (blur_amount < blur + 1)
+            if np.any(mask):
+                self.bands.append(((blur * 2 + 1, blur * 2 + 1), mask.astype(np.uint8)))
+        self._blurred = None
+
+    def apply(self, image, out=None):
+        image = np.asarray(image, dtype=np.uint8)
+        if out is None:
+            out = image.copy()
+        else:
+            np.copyto(out, image)
+        if self._blurred is None or self._blurred.shape != image.shape:
+            self._blurred = np.empty_like(image)
+
+        for ksize, mask in self.bands:
+            cv2.GaussianBlur(image, ksize, 0, dst=self._blurred)
+            cv2.copyTo(self._blurred, mask, out)
+        return out
+
+def get_vignette_mask(width, height, intensity=0.3):
+    """Retorna a máscara de vinheta em cache para a resolução e intensidade"""
+    return _mask_cache.get(
+        ("vignette", width, height, intensity),
+        lambda: VignetteMask(width, height, intensity)
+    )
+
+def get_depth_of_field_mask(width, height, focus_point=(0.5, 0.5), blur_intensity=5):
+    """Retorna as faixas de profundidade de campo em cache para a resolução e parâmetros"""
+    focus_point = tuple(focus_point)
+    return _mask_cache.get(
+        ("dof", width, height, blur_intensity, focus_point),
+        lambda: DepthOfFieldMask(width, height, focus_point, blur_intensity)
+    )
+
+# Bancos de grão pré-gerados por resolução, intensidade e semente
+_grain_cache = _LRUCache(max_entries=4)
+
+class GrainBank:
+    """Texturas de grão pré-geradas, alternadas e deslocadas a cada frame"""
+
+    def __init__(self, width, height, intensity=0.05, seed=0, bank_size=4, margin=64, offset_period=97):
+        self.width, self.height = width, height
+        rng = np.random.default_rng(seed)
+
+        # Cada textura é maior que o frame para permitir deslocamentos sem cópia.
+        # O grão com sinal é separado em partes positiva e negativa (uint8) para
+        # ser aplicado com soma e subtração saturadas.
+        self.tiles = []
+        for _ in range(bank_size):
+            grain = rng.standard_normal((height + margin, width + margin, 3), dtype=np.float32)
+            grain = np.clip(np.rint(grain * (intensity * 255)), -255, 255).astype(np.int16)
+            positive = np.clip(grain, 0, 255).astype(np.uint8)
+            negative = np.clip(-grain, 0, 255).astype(np.uint8)
+            self.tiles.append((positive, negative))
+
+        # Período primo para que textura e deslocamento só se repitam após bank_size * offset_period frames
+        self.offsets = rng.integers(0, margin + 1, size=(offset_period, 2))
+
+    def apply(self, image, frame_index, out=None):
+        """Aplica o grão do frame `frame_index` (em `out`, se fornecido)"""
+        positive, negative = self.tiles[frame_index % len(self.tiles)]
+        dy, dx = self.offsets[frame_index % len(self.offsets)]
+        positive = positive[dy:dy + self.height, dx:dx + self.width]
+        negative = negative[dy:dy + self.height, dx:dx + self.width]
+
+        out = cv2.add(np.asarray(image, dtype=np.uint8), positive, dst=out)
+        return cv2.subtract(out, negative, dst=out)
+
+def get_grain_bank(width, height, intensity=0.05, seed=0):
+    """Retorna o banco de grão em cache para a resolução, intensidade e semente"""
+    return _grain_cache.get(
+        (width, height, intensity, seed),
+        lambda: GrainBank(width, height, intensity, seed)
+    )
 
 # Efeitos cinematográficos avançados
 class CinematicEffects:
     @staticmethod
-    def film_grain(clip, intensity=0.05):
-        """Adiciona grão de filme cinematográfico"""
-        def add_grain(image):
-            grain = np.random.normal(0, intensity * 255, image.shape)
-            noisy_image = np.clip(image.astype(float) + grain, 0, 255).astype('uint8')
-            return noisy_image
+    def film_grain(clip, intensity=0.05, seed=0, fps=24):
+        """Adiciona grão de filme cinematográfico (reprodutível pela semente)"""
+        # Buffer de saída por resolução, reutilizado em todos os frames do clipe
+        buffers = {}
+
+        def add_grain(get_frame, t):
+            image = get_frame(t)
+            height, width = image.shape[:2]
+            bank = get_grain_bank(width, height, intensity, seed)
+            if (height, width) not in buffers:
+                buffers[(height, width)] = np.empty((height, width, 3), dtype=np.uint8)
+            return bank.apply(image, int(round(t * fps)), out=buffers[(height, width)])
         
-        return clip.fl_image(add_grain)
+        return clip.fl(add_grain)
     
     @staticmethod
-    def cinematic_color_grading(clip, style="drama"):
-        """Aplicar color grading cinematográfico"""
-        styles = {
-            "drama": {"contrast": 1.2, "saturation": 0.85, "brightness": 0.95, "temp": 0.95},
-            "thriller": {"contrast": 1.3, "saturation": 0.7, "brightness": 0.8, "temp": 0.8},
-            "romance": {"contrast": 1.1, "saturation": 1.1, "brightness": 1.05, "temp": 1.05},
-            "sci_fi": {"contrast": 1.15, "saturation": 0.9, "brightness": 0.9, "temp": 1.2}
-        }
-        
-        params = styles.get(style, styles["drama"])
-        
-        # Aplicar ajustes de cor
-        graded_clip = clip.fx(vfx.colorx, params["contrast"])  # Contraste
-        
-        # Ajuste de saturação
-        def adjust_saturation(image):
-            hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(float)
-            hsv[:,:,1] = hsv[:,:,1] * params["saturation"]
-            hsv[:,:,1] = np.clip(hsv[:,:,1], 0, 255)
-            return cv2.cvtColor(hsv.astype('uint8'), cv2.COLOR_HSV2RGB)
-        
-        # Ajuste de brilho
-        def adjust_brightness(image):
-            return np.clip(image.astype(float) * params["brightness"], 0, 255).astype('uint8')
-        
-        # Ajuste de temperatura
-        def adjust_temp(image):
-            # Aumenta o azul (mais frio) ou vermelho (mais quente)
-            b, g, r = cv2.split(image)
-            if params["temp"] < 1:  # Mais frio (azulado)
-                b = np.clip(b.astype(float) * (2 - params["temp"]), 0, 255).astype('uint8')
-            else:  # Mais quente (avermelhado)
-                r = np.clip(r.astype(float) * params["temp"], 0, 255).astype('uint8')
-            return cv2.merge([b, g, r])
-        
-        # Aplicar efeitos em sequência
-        graded_clip = graded_clip.fl_image(adjust_saturation)
-        graded_clip = graded_clip.fl_image(adjust_brightness)
-        graded_clip = graded_clip.fl_image(adjust_temp)
-        
-        return graded_clip
+    def cinematic_color_grading(clip, style="drama", lut_path=None):
+        """Aplicar color grading cinematográfico (estilo pré-definido ou LUT .cube)"""
+        lut = load_cube_lut(lut_path) if lut_path else compile_style_lut(style)
+        return clip.fl_image(lut.apply)
     
     @staticmethod
     def vignette_effect(clip, intensity=0.3):
         """Adiciona efeito de vinheta cinematográfica"""
         def add_vignette(image):
             height, width = image.shape[:2]
-            x = np.linspace(-1, 1, width)
-            y = np.linspace(-1, 1, height)
-            X, Y = np.meshgrid(x, y)
-            radius = np.sqrt(X**2 + Y**2)
-            
-            # Criar máscara de vinheta
-            vignette = np.clip(1 - intensity * radius, 0, 1)
-            vignette = np.dstack([vignette] * 3)  # Aplicar aos 3 canais RGB
-            
-            # Aplicar vinheta
-            return np.clip(image.astype(float) * vignette, 0, 255).astype('uint8')
+            return get_vignette_mask(width, height, intensity).apply(image)
         
         return clip.fl_image(add_vignette)
     
@@ -98,25 +335,17 @@ class CinematicEffects:
         """Simula profundidade de campo com desfoque gradual"""
         def apply_dof(image):
             height, width = image.shape[:2]
-            focus_x, focus_y = int(width * focus_point[0]), int(height * focus_point[1])
-            
-            # Criar máscara de distância do ponto focal
-            Y, X = np.ogrid[:height, :width]
-            dist_from_focus = np.sqrt((X - focus_x)**2 + (Y - focus_y)**2)
-            max_dist = np.sqrt(width**2 + height**2) / 2
-            blur_amount = np.clip(dist_from_focus / max_dist, 0, 1) * blur_intensity
-            
-            # Aplicar desfoque variável baseado na distância
-            result = image.copy()
-            for blur in range(1, int(blur_intensity) + 1, 2):
-                mask = (blur_amount >= blur - 1) & (blur_amount < blur + 1)
-                if not np.any(mask):
-                    continue
-                    
-                blurred = cv2.GaussianBlur(image, (blur * 2 + 1, blur * 2 + 1), 0)
-                result[mask] = blurred[mask]
-                
-            return result
+            return get_depth_of_field_mask(width, height, focus_point, blur_intensity).apply(image)
+        
+        # Cenas de imagem estática: desfocar a imagem de origem uma única vez. Só quando os frames
+        # vêm direto do renderizador; clipes derivados por fl/fl_image herdam o atributo ken_burns
+        # mas já têm outros efeitos (legendas, vinheta) aplicados sobre ele
+        renderer = getattr(clip, "ken_burns", None)
+        if renderer is not None and clip.make_frame == renderer.get_frame:
+            static_renderer = renderer.with_source_filter(apply_dof)
+            static_clip = VideoClip(static_renderer.get_frame, duration=clip.duration)
+            static_clip.ken_burns = static_renderer
+            return static_clip
             
         return clip.fl_image(apply_dof)
 
@@ -127,125 +356,15 @@ def create_cinematic_transition(clip1, clip2, transition_type="fade", duration=1
         # Se algum clipe for menor que a duração da transição, usar crossfade simples
         transition_type = "fade"
     
-    if transition_type == "fade":
-        # Usar crossfadein e crossfadeout nativos do moviepy
-        return concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration/2),
-            CompositeVideoClip([
-                clip1.subclip(clip1.duration - duration, clip1.duration).crossfadeout(duration),
-                clip2.subclip(0, duration).crossfadein(duration)
-            ])
-        ])
-    
-    elif transition_type == "wipe":
-        # Transição de varredura, estilo Star Wars
-        def make_frame(t):
-            progress = t / duration
-            width = clip1.w
-            height = clip1.h
-            
-            # Obter frames dos clipes originais
-            t1 = clip1.duration - duration + t
-            t2 = t
-            
-            if t1 <= clip1.duration and t2 <= clip2.duration:
-                frame1 = clip1.get_frame(t1)
-                frame2 = clip2.get_frame(t2)
-                
-                wipeX = int(width * progress)
-                result = frame1.copy()
-                if wipeX > 0:
-                    result[:, :wipeX] = frame2[:, :wipeX]
-                return result
-            elif t2 <= clip2.duration:
-                return clip2.get_frame(t2)
-            else:
-                return np.zeros((height, width, 3), dtype='uint8')
-                
-        # Criar um clipe para a transição
-        transition_clip = VideoClip(make_frame, duration=duration)
-        transition_clip = transition_clip.set_audio(CompositeAudioClip([
-            clip1.audio.subclip(clip1.duration - duration, clip1.duration).volumex(lambda t: 1-t/duration),
-            clip2.audio.subclip(0, duration).volumex(lambda t: t/duration)
-        ]) if clip1.audio is not None and clip2.audio is not None else None)
+    if transition_type in ("wipe", "dissolve", "zoom"):
+        # Os dois clipes continuam em movimento durante a transição; só a mistura usa os kernels uint8
+        start = clip1.duration - duration
+        engine = TransitionEngine(clip1.w, clip1.h)
         
-        # Concatenar os clipes
-        result = concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration),
-            transition_clip,
-            clip2.subclip(duration)
-        ], method="compose")
-        
-        return result
-    
-    elif transition_type == "dissolve":
-        # Dissolução com textura de filme
         def make_frame(t):
-            progress = t / duration
-            texture_noise = np.random.rand(clip1.h, clip1.w, 3) * 0.15
-            
-            # Obter frames dos clipes originais
-            t1 = clip1.duration - duration + t
-            t2 = t
-            
-            if t1 <= clip1.duration and t2 <= clip2.duration:
-                frame1 = clip1.get_frame(t1).astype(float) * (1 - progress)
-                frame2 = clip2.get_frame(t2).astype(float) * progress
-                
-                result = frame1 + frame2 + texture_noise
-                return np.clip(result, 0, 255).astype('uint8')
-            elif t2 <= clip2.duration:
-                return clip2.get_frame(t2)
-            else:
-                return np.zeros((clip1.h, clip1.w, 3), dtype='uint8')
-                
-        # Criar um clipe para a transição
-        transition_clip = VideoClip(make_frame, duration=duration)
-        transition_clip = transition_clip.set_audio(CompositeAudioClip([
-            clip1.audio.subclip(clip1.duration - duration, clip1.duration).volumex(lambda t: 1-t/duration),
-            clip2.audio.subclip(0, duration).volumex(lambda t: t/duration)
-        ]) if clip1.audio is not None and clip2.audio is not None else None)
-        
-        # Concatenar os clipes
-        result = concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration),
-            transition_clip,
-            clip2.subclip(duration)
-        ], method="compose")
-        
-        return result
-    
-    elif transition_type == "zoom":
-        # Transição com zoom
-        def make_frame(t):
-            progress = t / duration
-            
-            # Obter frames dos clipes originais
-            t1 = clip1.duration - duration + t
-            t2 = t
-            
-            if t1 <= clip1.duration and t2 <= clip2.duration:
-                # Calcular tamanhos de zoom
-                zoom1 = 1 + 0.2 * progress  # Zoom out
-                zoom2 = 1.2 - 0.2 * progress  # Zoom in
-                
-                # Redimensionar frames
-                h, w = clip1.h, clip1.w
-                frame1 = clip1.get_frame(t1)
-                frame2 = clip2.get_frame(t2)
-                
-                # Redimensionar (simulação simplificada)
-                # Em uma implementação real, usaríamos cv2.resize aqui
-                frame1_zoomed = frame1
-                frame2_zoomed = frame2
-                
-                # Misturar os frames com cross dissolve
-                result = frame1_zoomed.astype(float) * (1 - progress) + frame2_zoomed.astype(float) * progress
-                return np.clip(result, 0, 255).astype('uint8')
-            elif t2 <= clip2.duration:
-                return clip2.get_frame(t2)
-            else:
-                return np.zeros((clip1.h, clip1.w, 3), dtype='uint8')
+            frame1 = np.asarray(clip1.get_frame(start + t), dtype=np.uint8)
+            frame2 = np.asarray(clip2.get_frame(t), dtype=np.uint8)
+            return engine.blend(transition_type, frame1, frame2, t / duration)
         
         # Criar um clipe para a transição
         transition_clip = VideoClip(make_frame, duration=duration)
@@ -255,23 +374,20 @@ def create_cinematic_transition(clip1, clip2, transition_type="fade", duration=1
         ]) if clip1.audio is not None and clip2.audio is not None else None)
         
         # Concatenar os clipes
-        result = concatenate_videoclips([
+        return concatenate_videoclips([
             clip1.subclip(0, clip1.duration - duration),
             transition_clip,
             clip2.subclip(duration)
         ], method="compose")
-        
-        return result
     
-    else:
-        # Fallback para crossfade simples
-        return concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration/2),
-            CompositeVideoClip([
-                clip1.subclip(clip1.duration - duration, clip1.duration).crossfadeout(duration),
-                clip2.subclip(0, duration).crossfadein(duration)
-            ])
+    # "fade" e fallback: crossfade nativo do moviepy
+    return concatenate_videoclips([
+        clip1.subclip(0, clip1.duration - duration/2),
+        CompositeVideoClip([
+            clip1.subclip(clip1.duration - duration, clip1.duration).crossfadeout(duration),
+            clip2.subclip(0, duration).crossfadein(duration)
         ])
+    ])
 
 def apply_dynamic_camera_movement(clip, duration, movement_type="dolly", final_resolution=(1920, 1080)):
     """Aplica movimentos de câmera cinematográficos"""
@@ -377,108 +493,106 @@ def apply_dynamic_camera_movement(clip, duration, movement_type="dolly", final_r
 def create_dynamic_subtitles(text, duration, final_resolution):
     """Cria legendas dinâmicas word-by-word sem fundo"""
     logger.info(f"Gerando legendas dinâmicas para o texto: '{text}' com duração {duration}s")
-    width, height = final_resolution
-    words = text.split()
-    word_duration = duration / len(words)
-    
-    # Criar clipes de texto para cada palavra
-    text_clips = []
-    
-    # Definir cores elegantes para as palavras
-    colors = ['#FFFFFF', '#F5F5F5', '#FAFAFA', '#F0F0F0', '#EFEFEF']
-    
-    font_size = min(40, int(width / 25))  # Tamanho de fonte adaptativo
-    
-    for i, word in enumerate(words):
-        start_time = i * word_duration
-        
-        # Criar clipe de texto com uma fonte elegante
-        txt_clip = TextClip(
-            word,
-            fontsize=font_size,
-            font='Arial-Bold',
-            color=colors[i % len(colors)],
-            stroke_color='black',
-            stroke_width=1.5,
-            method='label'
+    return SubtitleRenderer(text, duration, final_resolution)
+
+class KenBurnsRenderer:
+    """Renderiza o zoom Ken Burns com a trajetória pré-calculada e um único warpAffine por frame"""
+
+    def __init__(self, image_path, final_resolution, duration, fps=24, zoom_start=1.0, zoom_end=1.15, overscan=1.1):
+        self.width, self.height = final_resolution
+        self.duration = duration
+        self.fps = fps
+
+        # Decodificar a imagem uma única vez (OpenCV lê em BGR)
+        source = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if source is None:
+            raise FileNotFoundError(f"Não foi possível decodificar a imagem: {image_path}")
+        source = cv2.cvtColor(source, cv2.COLOR_BGR2RGB)
+
+        # Escala base para cobrir toda a tela, com 10% extra de margem
+        src_height, src_width = source.shape[:2]
+        base_scale = max(self.width / src_width, self.height / src_height) * overscan
+
+        # Se a imagem só é reduzida, reduzir a fonte uma vez com INTER_AREA para evitar aliasing
+        max_scale = base_scale * max(zoom_start, zoom_end)
+        if max_scale < 1.0:
+            source = cv2.resize(
+                source,
+                (max(1, round(src_width * max_scale)), max(1, round(src_height * max_scale))),
+                interpolation=cv2.INTER_AREA
+            )
+            src_height, src_width = source.shape[:2]
+            base_scale = max(self.width / src_width, self.height / src_height) * overscan
+
+        self.source = np.ascontiguousarray(source)
+
+        # Trajetória de zoom para todos os instantes de frame
+        self.frame_count = max(1, int(np.ceil(duration * fps)))
+        times = np.minimum(np.arange(self.frame_count + 1) / fps, duration)
+        progress = times / duration if duration > 0 else np.zeros_like(times)
+        scales = base_scale * (zoom_start + (zoom_end - zoom_start) * progress)
+
+        # Matriz afim centralizada: dst = s * src + (centro_dst - s * centro_src)
+        self.matrices = np.zeros((len(scales), 2, 3), dtype=np.float64)
+        self.matrices[:, 0, 0] = scales
+        self.matrices[:, 1, 1] = scales
+        self.matrices[:, 0, 2] = (self.width - 1) / 2 - scales * (src_width - 1) / 2
+        self.matrices[:, 1, 2] = (self.height - 1) / 2 - scales * (src_height - 1) / 2
+
+        # Buffer de saída reutilizado em todos os frames
+        self._buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    def with_source_filter(self, image_filter):
+        """Retorna um renderizador com a mesma trajetória e a imagem de origem filtrada uma única vez"""
+        filtered = copy.copy(self)
+        filtered.source = np.ascontiguousarray(image_filter(self.source))
+        filtered._buffer = np.empty_like(self._buffer)
+        return filtered
+
+    def frame_index(self, t):
+        """Converte um instante em segundos para o índice de frame da trajetória"""
+        return min(max(int(round(t * self.fps)), 0), len(self.matrices) - 1)
+
+    def render_index(self, index, out=None):
+        """Renderiza o frame de índice `index` no buffer reutilizável (ou em `out`)"""
+        dst = self._buffer if out is None else out
+        cv2.warpAffine(
+            self.source,
+            self.matrices[index],
+            (self.width, self.height),
+            dst=dst,
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_REPLICATE
         )
-        
-        # Definir duração do clipe
-        txt_clip = txt_clip.set_duration(word_duration)
-        
-        # Adicionar fade in/out suave
-        fade_duration = min(0.3, word_duration / 3)
-        txt_clip = txt_clip.fx(vfx.fadein, fade_duration)
-        txt_clip = txt_clip.fx(vfx.fadeout, fade_duration)
-        
-        # Animar a entrada da palavra (leve movimento para cima)
-        def word_pos(t):
-            # Movimento suave para a posição final
-            prog = min(1, t / (word_duration * 0.4))
-            y_offset = 20 * (1 - prog)
-            return ('center', height - 120 - y_offset)
-            
-        txt_clip = txt_clip.set_position(word_pos)
-        
-        # Definir tempo de início
-        txt_clip = txt_clip.set_start(start_time)
-        
-        text_clips.append(txt_clip)
-    
-    # Criar um clipe composto apenas com as palavras (sem fundo)
-    subtitle_composite = CompositeVideoClip(text_clips, size=final_resolution)
-    
-    return subtitle_composite
+        return dst
+
+    def get_frame(self, t):
+        """make_frame compatível com o MoviePy; o buffer retornado é reutilizado a cada chamada"""
+        return self.render_index(self.frame_index(t))
 
 def create_scene_clip(item, config):
     """Cria um clipe de cena com zoom suave e garantindo preenchimento total da tela"""
-    logger.info(f"Criando clipe para a cena: {item.get('image_path')}")
+    logger.info(f"Criando clipe para a cena: {item.image_path}")
     
     # Verificar se temos o caminho da imagem
-    image_path = item.get("image_path") or item.get("filename", "")
-    if not image_path or not os.path.exists(image_path):
-        raise FileNotFoundError(f"Arquivo de imagem não encontrado: {image_path}")
-    
-    width, height = config.final_resolution
-    
-    # Criar clipe da imagem
-    img_clip = ImageClip(image_path)
-    
-    # Calcular proporções para garantir que a imagem cubra toda a tela
-    img_width, img_height = img_clip.size
-    
-    # Determinar o fator de escala para garantir que a imagem cubra toda a tela
-    width_ratio = width / img_width
-    height_ratio = height / img_height
-    scale_factor = max(width_ratio, height_ratio) * 1.1  # Adiciona 10% extra para garantir cobertura
-    
-    # Redimensionar a imagem para garantir cobertura total
-    img_clip = img_clip.resize(width=img_width*scale_factor, height=img_height*scale_factor)
-    
-    # Centralizar a imagem
-    img_clip = img_clip.set_position("center")
+    if not item.image_path or not os.path.exists(item.image_path):
+        raise FileNotFoundError(f"Arquivo de imagem não encontrado: {item.image_path}")
     
-    # Aplicar efeito de zoom suave e lento
-    duration = item["duration"]
+    # Zoom de 1.0 até 1.15 ao longo da duração, pré-calculado uma única vez
+    renderer = KenBurnsRenderer(item.image_path, config.final_resolution, item.duration, fps=config.fps)
     
-    def zoom_effect(t):
-        # Zoom aumenta de 1.0 até 1.15 (15% de zoom) ao longo da duração
-        zoom_factor = 1.0 + (0.15 * t / duration)
-        return zoom_factor
+    result_clip = VideoClip(renderer.get_frame, duration=item.duration)
+    result_clip.ken_burns = renderer
     
-    # Aplicar efeito de zoom à imagem
-    zoomed_clip = img_clip.fx(
-        vfx.resize, 
-        lambda t: zoom_effect(t)
-    )
-    
-    # Cortar para garantir que estamos exatamente no tamanho desejado
-    result_clip = zoomed_clip.set_duration(duration).crop(
-        x_center=zoomed_clip.w/2,
-        y_center=zoomed_clip.h/2,
-        width=width,
-        height=height
-    )
+    # Adicionar legendas dinâmicas se solicitado (no modo "soft" elas vão para uma faixa separada)
+    if config.add_subtitles and config.subtitle_mode == "burn":
+        try:
+            subtitles = create_dynamic_subtitles(item.prompt, item.duration, config.final_resolution)
+            
+            # Desenhar as legendas diretamente nos frames da cena
+            result_clip = result_clip.fl(subtitles.overlay)
+        except Exception as e:
+            logger.error(f"Erro ao criar legendas: {e}")
     
     return result_clip
 
@@ -486,148 +600,93 @@ def create_narrative_video(config, content_data):
     logger.info(f"Iniciando criação do vídeo com add_subtitles={config.add_subtitles}")
     logger.info(f"Conteúdo recebido: {len(content_data)} cenas")
     
-    clips = []
+    # Backend padrão: frames gerados em numpy e enviados direto ao ffmpeg
+    if config.render_backend == "ffmpeg":
+        from render import render_narrative_video
+        return render_narrative_video(config, content_data)
     
+    # Verificar se temos cenas para renderizar
+    if not content_data:
+        raise ValueError("Nenhum clipe válido foi criado")
     for i, item in enumerate(content_data):
-        try:
-            # Verificar se temos todos os dados necessários
-            if not item.get("duration"):
-                raise ValueError(f"Cena {i+1} não tem duração definida")
-            if not item.get("audio_clip"):
-                raise ValueError(f"Cena {i+1} não tem áudio definido")
-            
-            logger.info(f"Processando cena {i+1} com duração {item['duration']}s")
-            
-            # Criar clipe da cena principal
-            scene_clip = create_scene_clip(item, config)
-            audio_clip = item["audio_clip"]
-            
-            # Adicionar áudio à cena
-            scene = scene_clip.set_audio(audio_clip)
-            
-            # Adicionar legendas dinâmicas se solicitado
-            if config.add_subtitles:
-                logger.info(f"Adicionando legendas dinâmicas para a cena {i+1}")
-                try:
-                    subtitle_clip = create_dynamic_subtitles(
-                        item["prompt"], 
-                        item["duration"], 
-                        config.final_resolution
-                    )
-                    
-                    # Combinar cena principal com legendas
-                    scene = CompositeVideoClip(
-                        [scene, subtitle_clip],
-                        size=config.final_resolution
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao criar legendas: {e}")
-            
-            clips.append(scene)
-        except Exception as e:
-            logger.error(f"Erro ao processar cena {i+1}: {e}")
-            raise
+        item.validate(i)
+        logger.info(f"Cena {i+1} com duração {item.duration:.2f}s")
     
-    # Verificar se temos clipes para concatenar
-    if not clips:
-        raise ValueError("Nenhum clipe válido foi criado")
+    # Linha do tempo plana: cada frame avalia no máximo duas cenas, sem clipes aninhados
+    timeline = Timeline([item.duration for item in content_data], fps=config.fps)
+    scene_starts = list(timeline.starts)
+    width, height = config.final_resolution
+    buffer = np.empty((height, width, 3), dtype=np.uint8)
+    engine = TransitionEngine(width, height)
     
-    # Criar transições dinâmicas entre cenas
-    final_clips = []
+    # Clipes criados apenas enquanto a cena está na tela e descartados em seguida
+    clips = {}
     
-    if len(clips) == 1:
-        final_clips = clips
-    else:
-        # Primeiro clipe permanece como está
-        final_clips.append(clips[0])
-        
-        # Criar transições para cada par de clipes subsequentes
-        for i in range(1, len(clips)):
-            prev_clip = clips[i-1]
-            current_clip = clips[i]
-            
-            # Usar vários tipos de transição de forma alternada para variedade
-            transition_types = ["dissolve", "crossfade", "fade"]
-            transition_type = transition_types[i % len(transition_types)]
-            
-            # Duração da transição - mais curta para clipes curtos
-            min_duration = min(prev_clip.duration, current_clip.duration)
-            transition_duration = min(1.0, min_duration / 4)
-            
-            try:
-                if transition_type == "crossfade" or transition_type == "fade":
-                    # Usar o crossfadein nativo da MoviePy
-                    transition_clip = vfx.crossfadein(current_clip, transition_duration)
-                    final_clips.append(transition_clip)
-                    
-                elif transition_type == "dissolve":
-                    # Transição com dissolução
-                    # Calcular o ponto inicial de transição no clipe anterior
-                    overlap_start = max(0, prev_clip.duration - transition_duration)
-                    
-                    # Recortar o final do clipe anterior para a transição
-                    clip1_part = prev_clip.subclip(0, overlap_start)
-                    
-                    # Criar uma região de sobreposição
-                    overlap = CompositeVideoClip([
-                        prev_clip.subclip(overlap_start).set_opacity(lambda t: 1 - t/transition_duration),
-                        current_clip.subclip(0, transition_duration).set_opacity(lambda t: t/transition_duration)
-                    ])
-                    
-                    # Adicionar o resto do clipe atual
-                    clip2_part = current_clip.subclip(transition_duration)
-                    
-                    # Concatenar as partes sem transição
-                    composite = concatenate_videoclips([clip1_part, overlap, clip2_part], method="compose")
-                    final_clips[-1] = composite
-                else:
-                    # Fallback para adição simples se a transição falhar
-                    final_clips.append(current_clip)
-            except Exception as e:
-                logger.error(f"Erro ao aplicar transição: {e}")
-                # Adicionar o clipe atual sem transição em caso de erro
-                final_clips.append(current_clip)
+    def scene_frame(scene, local_t):
+        for index in [index for index in clips if index < scene - 1]:
+            del clips[index]
+        if scene not in clips:
+            clips[scene] = create_scene_clip(content_data[scene], config)
+        return np.asarray(clips[scene].get_frame(local_t), dtype=np.uint8)
     
-    # Concatenar os clipes finais
-    final_video = concatenate_videoclips(final_clips, method="compose")
+    def make_frame(t):
+        return compose_frame(timeline.lookup_time(t), scene_frame, buffer, engine)
     
-    # Adicionar música de fundo se especificada
-    if hasattr(config, 'audio_path') and config.audio_path and os.path.exists(config.audio_path):
-        try:
-            bg_audio = AudioFileClip(config.audio_path)
-            bg_audio = bg_audio.volumex(0.2)  # Volume baixo para não competir com a narração
-            
-            # Ajustar duração da música
-            if bg_audio.duration < final_video.duration:
-                # Repetir o áudio para cobrir todo o vídeo
-                repeats = int(np.ceil(final_video.duration / bg_audio.duration))
-                bg_audio_parts = [bg_audio] * repeats
-                bg_audio_extended = concatenate_audioclips(bg_audio_parts)
-                bg_audio = bg_audio_extended.subclip(0, final_video.duration)
-            else:
-                bg_audio = bg_audio.subclip(0, final_video.duration)
-            
-            # Misturar com o áudio existente
-            if final_video.audio is not None:
-                final_audio = CompositeAudioClip([final_video.audio, bg_audio])
-                final_video = final_video.set_audio(final_audio)
-            else:
-                final_video = final_video.set_audio(bg_audio)
-        except Exception as e:
-            logger.error(f"Erro ao adicionar música de fundo: {e}")
+    final_video = VideoClip(make_frame, duration=timeline.duration)
     
     # Renderizar vídeo final
     output_path = os.path.join(config.output_dir, config.output_filename)
     print(f"Renderizando vídeo... Duração total: {final_video.duration:.2f}s")
     
-    final_video.write_videofile(
-        output_path, 
-        fps=24, 
-        codec="libx264", 
-        audio_codec="aac", 
-        bitrate="5000k",
-        threads=4
+    # Narração e música mixadas em numpy em uma única faixa
+    audio_path = render_audio_track(
+        config, [item.audio_path for item in content_data], scene_starts, timeline.duration,
+        f"{os.path.splitext(output_path)[0]}.mix.wav"
     )
+    audio_clip = None
+    try:
+        audio_clip = AudioFileClip(audio_path)
+        final_video = final_video.set_audio(audio_clip)
+        final_video.write_videofile(
+            output_path, 
+            fps=config.fps, 
+            codec=config.video_codec, 
+            audio_codec=config.audio_codec, 
+            bitrate=config.video_bitrate,
+            threads=4
+        )
+    finally:
+        if audio_clip is not None:
+            audio_clip.close()
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+    
+    # Legendas "soft": arquivos SRT/WebVTT e faixa mov_text, sem tocar nos pixels
+    if config.add_subtitles and config.subtitle_mode == "soft":
+        write_soft_subtitles(config, content_data, scene_starts, output_path)
     
     print(f"Vídeo narrativo salvo em: {output_path}")
-    return output_path
\ No newline at end of file
+    return output_path
+
+def write_subtitle_files(config, content_data, scene_starts, output_path):
+    """Salva as legendas em SRT/WebVTT ao lado do vídeo e retorna o caminho do SRT"""
+    cues = build_subtitle_cues(
+        [
+            (start, item.duration, item.prompt, load_narration_segments(item.audio_path))
+            for start, item in zip(scene_starts, content_data)
+        ],
+        granularity=config.subtitle_granularity
+    )
+    base = os.path.splitext(output_path)[0]
+    srt_path = write_srt(cues, f"{base}.srt")
+    write_webvtt(cues, f"{base}.vtt")
+    logger.info(f"Legendas salvas em: {srt_path} ({len(cues)} cues)")
+    return srt_path
+
+def write_soft_subtitles(config, content_data, scene_starts, output_path):
+    """Salva as legendas em SRT/WebVTT ao lado do vídeo e as embute como faixa de legendas"""
+    srt_path = write_subtitle_files(config, content_data, scene_starts, output_path)
+    try:
+        mux_subtitles(output_path, srt_path, config.lang_code)
+    except Exception as e:
+        logger.error(f"Erro ao embutir legendas no vídeo: {e}")